@@ -0,0 +1,200 @@
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+import instrument
+import tau_extrema_sequence
+import graded_roots
+import find_d_invariant
+import triple_cache
+
+REFERENCE_PATH = 'benchmark_reference.json'
+
+# ladder of Brieskorn triples from tiny to large pqr; each tier includes the ones before it
+LADDER = {
+    'quick': [(2, 3, 7), (3, 5, 7), (5, 7, 11), (7, 11, 13), (11, 13, 101), (11, 13, 1003)],
+    'full': [(2, 3, 7), (3, 5, 7), (5, 7, 11), (7, 11, 13), (11, 13, 101), (11, 13, 1003), (7, 11, 5003), (11, 13, 10007)],
+}
+
+def _digest(value):
+    return hashlib.blake2b(repr(value).encode(), digest_size=16).hexdigest()
+
+def _graph_summary(graph):
+    # the Node graph itself has no stable repr, so summarize it by its layer counts and the end of its stem
+    return (sorted(graph.counts.items()), graph.stem_end.layer)
+
+# each stage is (name, setup, run, summarize): setup prepares the input outside of the measurement,
+# run is the measured call, and summarize turns its output into something to compare against the reference
+STAGES = [
+    ('needed_semigroup', lambda p,q,r: (p,q,r), lambda args: tau_extrema_sequence.needed_semigroup(*args), lambda out: out),
+    ('compute_tau', lambda p,q,r: (p,q,r), lambda args: tau_extrema_sequence.compute_tau(*args), lambda out: out),
+    ('extrema_sequence', lambda p,q,r: (p,q,r), lambda args: tau_extrema_sequence.extrema_sequence(*args), lambda out: out),
+    ('extrema_sequence_half', lambda p,q,r: (p,q,r), lambda args: tau_extrema_sequence.extrema_sequence(*args, half=True), lambda out: out),
+    ('build_graph', lambda p,q,r: tau_extrema_sequence.extrema_sequence(p,q,r), graded_roots.build_graph, _graph_summary),
+    ('maximal_monotone_subroot', lambda p,q,r: tau_extrema_sequence.extrema_sequence(p,q,r), graded_roots.maximal_monotone_subroot, lambda out: list(out.items())),
+    ('find_d_invariant', lambda p,q,r: (p,q,r), lambda args: find_d_invariant.find_d_invariant(*args), lambda out: out),
+]
+
+def revision():
+    '''
+    Returns (str): the current git commit, or None outside of a git checkout
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure(run, args, repeat):
+    '''
+    Args:
+        run (callable): the stage to measure
+        args (object): its input
+        repeat (int): how many times to time it
+
+    Returns (tuple of 3): the output of the stage, its best wall time in seconds, and its peak traced memory in bytes
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = run(args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    # tracing allocations slows everything down, so memory is measured on a separate run
+    tracemalloc.start()
+    run(args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return output, best, peak
+
+def run_benchmarks(ladder='quick', stages=None, repeat=3, reference=None):
+    '''
+    Args:
+        ladder (str): an optional argument to choose the ladder of triples, a key of LADDER
+        stages (list[str]): an optional argument to only run some of the stages
+        repeat (int): an optional argument to specify how many times each stage is timed
+        reference (dict[str, str]): an optional argument with the expected digest of each output, keyed by "stage p, q, r"
+
+    Returns (dict): a machine-readable report with the environment and one result per stage and triple
+    '''
+    # measure the computations themselves rather than hits in the per-triple cache, and restore the caller's cache afterwards
+    previous = triple_cache._cache
+    triple_cache._cache = triple_cache.TripleCache(max_bytes=0)
+
+    results = []
+    try:
+        for name, setup, run, summarize in STAGES:
+            if stages is not None and name not in stages:
+                continue
+            for p, q, r in LADDER[ladder]:
+                args = setup(p,q,r)
+                output, seconds, peak = measure(run, args, repeat)
+                key = f'{name} {p}, {q}, {r}'
+                digest = _digest(summarize(output))
+                results.append({
+                    'stage': name,
+                    'triple': [p, q, r],
+                    'N0': tau_extrema_sequence.find_naught(p,q,r),
+                    'seconds': seconds,
+                    'peak_bytes': peak,
+                    'digest': digest,
+                    'matches_reference': None if reference is None or key not in reference else reference[key] == digest,
+                })
+                print(f'{key}: {seconds:.4f}s, {peak/2**20:.2f} MiB' + ('' if results[-1]['matches_reference'] is not False else ' MISMATCH'))
+    finally:
+        triple_cache._cache = previous
+
+    return {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'ladder': ladder,
+        'repeat': repeat,
+        'results': results,
+    }
+
+def compare(base, new, threshold=1.2, min_seconds=1e-3, min_bytes=2**16):
+    '''
+    Args:
+        base, new (dict): reports written by run_benchmarks
+        threshold (float): an optional argument to specify the ratio of time or memory above which a stage counts as a regression
+        min_seconds, min_bytes (float): optional arguments to ignore changes in stages too small for the ratio to be meaningful
+
+    Returns (list[str]): a description of every regression or output mismatch of new relative to base
+    '''
+    old = {(result['stage'], tuple(result['triple'])): result for result in base['results']}
+    problems = []
+    for result in new['results']:
+        key = (result['stage'], tuple(result['triple']))
+        if key not in old:
+            continue
+        before = old[key]
+        name = f'{key[0]} {key[1]}'
+        if result['digest'] != before['digest']:
+            problems.append(f'{name}: output changed')
+        if result['seconds'] >= min_seconds and result['seconds'] > threshold*before['seconds']:
+            problems.append(f"{name}: time {before['seconds']:.4f}s -> {result['seconds']:.4f}s")
+        if result['peak_bytes'] >= min_bytes and result['peak_bytes'] > threshold*before['peak_bytes']:
+            problems.append(f"{name}: peak memory {before['peak_bytes']} -> {result['peak_bytes']} bytes")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time and measure the memory of every stage of the pipeline on a ladder of Brieskorn triples.')
+    parser.add_argument('--ladder', choices=sorted(LADDER), default='quick')
+    parser.add_argument('--stage', action='append', dest='stages', help='only run this stage; can be given more than once')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='where to write the JSON report')
+    parser.add_argument('--reference', default=REFERENCE_PATH, help='JSON file with the expected output digests')
+    parser.add_argument('--update-reference', action='store_true', help='overwrite the reference digests with the outputs of this run')
+    parser.add_argument('--compare', help='earlier JSON report to check this run against for regressions')
+    parser.add_argument('--threshold', type=float, default=1.2)
+    parser.add_argument('--trace', help='where to write a JSON trace of every instrumented stage during the run')
+    args = parser.parse_args(argv)
+
+    if args.trace is not None:
+        instrument.enable(trace=True)
+
+    try:
+        with open(args.reference) as f:
+            reference = json.load(f)
+    except FileNotFoundError:
+        reference = {}
+
+    report = run_benchmarks(args.ladder, args.stages, args.repeat, None if args.update_reference else reference)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    if args.trace is not None:
+        instrument.write_trace(args.trace)
+
+    if args.update_reference:
+        for result in report['results']:
+            p, q, r = result['triple']
+            reference[f"{result['stage']} {p}, {q}, {r}"] = result['digest']
+        with open(args.reference, 'w') as f:
+            json.dump(reference, f, indent=1, sort_keys=True)
+
+    failed = [result for result in report['results'] if result['matches_reference'] is False]
+    for result in failed:
+        print(f"output of {result['stage']} on {tuple(result['triple'])} does not match the reference")
+
+    problems = []
+    if args.compare is not None:
+        with open(args.compare) as f:
+            problems = compare(json.load(f), report, args.threshold)
+        for problem in problems:
+            print(problem)
+
+    return 1 if failed or problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import io
+import ast
+import sys
+import csv
+import json
+import argparse
+import functools
+import itertools
+
+import family
+import sweep
+import find_d_invariant
+
+def _evaluate_bound(node, names):
+    # only integer arithmetic in the names is allowed in a bound, e.g. 2*p*q+1
+    if isinstance(node, ast.Expression):
+        return _evaluate_bound(node.body, names)
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in names:
+        return names[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_evaluate_bound(node.operand, names)
+    if isinstance(node, ast.BinOp):
+        left = _evaluate_bound(node.left, names)
+        right = _evaluate_bound(node.right, names)
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        if isinstance(node.op, ast.FloorDiv):
+            return left // right
+    raise ValueError(f'unsupported expression in range: {ast.dump(node)}')
+
+def parse_range(spec, names=()):
+    '''
+    Args:
+        spec (str): either a comma separated list of values, or start:stop or start:stop:step with stop included;
+            each value may be an integer expression in names, e.g. "q+1:2*p*q+1"
+        names (tuple[str]): the parameters the values may depend on, e.g. ('p', 'q') for the range of r
+
+    Returns (callable): a function of the parameters in names returning the values of the range,
+        in the form expected by sweep.brieskorn_triples
+    '''
+    if ':' in spec:
+        parts = [ast.parse(part.strip(), mode='eval') for part in spec.split(':')]
+        if len(parts) not in (2, 3):
+            raise ValueError(f'range must be start:stop or start:stop:step, got {spec!r}')
+    else:
+        parts = [ast.parse(part.strip(), mode='eval') for part in spec.split(',')]
+
+    def values(*args):
+        bound = dict(zip(names, args))
+        evaluated = [_evaluate_bound(part, bound) for part in parts]
+        if ':' not in spec:
+            return evaluated
+        step = evaluated[2] if len(evaluated) == 3 else 1
+        return range(evaluated[0], evaluated[1] + (1 if step > 0 else -1), step)
+
+    return values
+
+def _extrema_rows(p, q, rs):
+    brieskorn = family.BrieskornFamily(p,q)
+    return [{'N0': p*q*r - p*q - q*r - r*p, 'extrema': brieskorn.extrema_sequence(r)} for r in rs]
+
+def _d_invariant_rows(p, q, rs):
+    columns = find_d_invariant.TABLE_COLUMNS[3:]
+    return [dict(zip(columns, row)) for row in find_d_invariant._family_rows(p,q,rs)]
+
+def _subroot_rows(p, q, rs):
+    # imported here so that the other subcommands do not need the plotting dependencies of graded_roots
+    import graded_roots
+    brieskorn = family.BrieskornFamily(p,q)
+    rows = []
+    for r in rs:
+        subroot = graded_roots.maximal_monotone_subroot(brieskorn.extrema_sequence(r))
+        rows.append({
+            'bottom': min(subroot.keys()),
+            'top': max(subroot.keys()),
+            'branches': [[layer, depth] for layer, depth in subroot.items() if depth != layer],
+            'hash': graded_roots.monotone_hash(subroot),
+        })
+    return rows
+
+def _grid_rows(p, q, rs, save_dir='.', block_rows=256):
+    # imported here so that the other subcommands do not need xlsxwriter
+    import generate_grid
+    return [{'path': generate_grid.generate_grid(p,q,r,save_dir=save_dir,block_rows=block_rows)} for r in rs]
+
+# each subcommand is (worker, columns): the worker computes the rows for a batch of triples with the same p, q,
+# and the columns of its rows follow p, q, r in the output
+COMMANDS = {
+    'extrema': (_extrema_rows, ('N0', 'extrema')),
+    'd-invariant': (_d_invariant_rows, find_d_invariant.TABLE_COLUMNS[3:]),
+    'subroot': (_subroot_rows, ('bottom', 'top', 'branches', 'hash')),
+    'grid': (_grid_rows, ('path',)),
+}
+
+def batches(triples, batch_size):
+    '''
+    Args:
+        triples (iterable[tuple[int, int, int]]): the triples to compute
+        batch_size (int): the largest number of values of r in a batch
+
+    Returns (generator[tuple[int, int, tuple[int]]]): lazily yields (p, q, rs) for each run of consecutive triples with the same p, q,
+        split into batches of at most batch_size, so that each batch shares the work that only depends on p and q
+    '''
+    for (p, q), group in itertools.groupby(triples, key=lambda triple: triple[:2]):
+        group = iter(group)
+        while True:
+            rs = tuple(r for _, _, r in itertools.islice(group, batch_size))
+            if not rs:
+                break
+            yield (p, q, rs)
+
+class RowWriter:
+    '''
+    Class which streams rows to a text file as JSON lines or as CSV/TSV, writing in blocks of rows
+
+    Attributes:
+        f (file): the file to write to
+        columns (tuple[str]): the names of the columns, in order
+        fmt (str): one of 'jsonl', 'csv', 'tsv'
+        flush_every (int): how many rows are collected before they are written out
+    '''
+    def __init__(self, f, columns, fmt='jsonl', flush_every=1024):
+        self.f = f
+        self.columns = columns
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self._buffer = io.StringIO()
+        self._pending = 0
+        self._csv = None
+        if fmt != 'jsonl':
+            self._csv = csv.writer(self._buffer, delimiter=',' if fmt == 'csv' else '\t', lineterminator='\n')
+            self._csv.writerow(columns)
+            self._pending += 1
+
+    def write(self, row):
+        if self._csv is None:
+            self._buffer.write(json.dumps(row, separators=(',', ':')))
+            self._buffer.write('\n')
+        else:
+            self._csv.writerow([_cell(row[column]) for column in self.columns])
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.f.write(self._buffer.getvalue())
+        self.f.flush()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._pending = 0
+
+def _cell(value):
+    # lists are written space separated within a cell, and pairs as layer:depth
+    if isinstance(value, list):
+        return ' '.join(':'.join(map(str, item)) if isinstance(item, list) else str(item) for item in value)
+    return value
+
+def run(command, triples, f, fmt='jsonl', processes=1, batch_size=64, ordered=True, flush_every=1024, **options):
+    '''
+    Args:
+        command (str): a key of COMMANDS
+        triples (iterable[tuple[int, int, int]]): the valid triples to compute
+        f (file): the text file to stream the rows to
+        fmt (str): an optional argument to choose the output format, one of 'jsonl', 'csv', 'tsv'
+        processes (int): an optional argument to specify the number of worker processes
+        batch_size (int): an optional argument to specify how many triples with the same p, q are sent to a worker at a time
+        ordered (bool): an optional argument to specify whether rows come out in the order of triples
+        flush_every (int): an optional argument to specify how many rows are collected before they are written out
+        options: extra keyword arguments of the worker, e.g. save_dir for the grid
+
+    Returns (int): the number of rows written
+    '''
+    worker, columns = COMMANDS[command]
+    if options:
+        worker = functools.partial(worker, **options)
+
+    writer = RowWriter(f, ('p', 'q', 'r') + tuple(columns), fmt, flush_every)
+    count = 0
+    for (p, q, rs), rows in sweep.sweep(worker, batches(triples, batch_size), processes=processes, chunksize=1, ordered=ordered):
+        for r, row in zip(rs, rows):
+            writer.write(dict({'p': p, 'q': q, 'r': r}, **row))
+            count += 1
+    writer.flush()
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute invariants of Brieskorn spheres for ranges or files of triples, streaming one row per triple.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command in COMMANDS:
+        sub = subparsers.add_parser(command)
+        sub.add_argument('--p', help='values of p, as start:stop[:step] with stop included or as a comma separated list')
+        sub.add_argument('--q', help='values of q; may depend on p, e.g. p+1:20')
+        sub.add_argument('--r', help='values of r; may depend on p and q, e.g. q+1:2*p*q+1')
+        sub.add_argument('--triple', action='append', default=[], help='a single triple p,q,r; can be given more than once')
+        sub.add_argument('--file', help='file with one triple per line, or - for standard input')
+        sub.add_argument('--format', choices=('jsonl', 'csv', 'tsv'), default='jsonl')
+        sub.add_argument('--output', default='-', help='where to write the rows; defaults to standard output')
+        sub.add_argument('--processes', type=int, default=1)
+        sub.add_argument('--batch-size', type=int, default=64, help='number of triples with the same p, q sent to a worker at a time')
+        sub.add_argument('--unordered', action='store_true', help='write rows as soon as they are done instead of in order')
+        sub.add_argument('--flush-every', type=int, default=1024, help='number of rows collected before they are written out')
+        if command == 'grid':
+            sub.add_argument('--save-dir', default='.', help='directory to save the spreadsheets in')
+            sub.add_argument('--block-rows', type=int, default=256, help='number of rows of Delta computed at a time')
+    args = parser.parse_args(argv)
+
+    sources = []
+    if args.p is not None or args.q is not None or args.r is not None:
+        if args.p is None or args.q is None or args.r is None:
+            parser.error('--p, --q and --r must be given together')
+        sources.append(sweep.brieskorn_triples(parse_range(args.p)(), parse_range(args.q, ('p',)), parse_range(args.r, ('p', 'q'))))
+    if args.triple:
+        sources.append(sweep.valid_triples(tuple(int(part) for part in triple.split(',')) for triple in args.triple))
+    if args.file is not None:
+        sources.append(sweep.valid_triples(sweep.read_triples(args.file)))
+    if not sources:
+        parser.error('no triples given; use --p/--q/--r, --triple or --file')
+
+    options = {'save_dir': args.save_dir, 'block_rows': args.block_rows} if args.command == 'grid' else {}
+
+    f = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        run(args.command, itertools.chain(*sources), f, args.format, args.processes, args.batch_size, not args.unordered, args.flush_every, **options)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+import math
+import itertools
+
+import sweep
+import tau_extrema_sequence
+
+def canonical_triple(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (tuple[int, int, int]): the same parameters in increasing order; the tau sequence is symmetric in p, q, r,
+        and BrieskornFamily(p, q) walks rows of length p*q, so the family of the two smallest parameters has the shortest rows
+        and is the one shared by the most triples
+    '''
+    return tuple(sorted((p,q,r)))
+
+class BrieskornFamily:
+    '''
+    Class which represents the Brieskorn spheres with fixed p, q and varying r,
+    sharing the work that depends only on p, q (and on r mod p*q) between all of them
+
+    Every element of the semigroup below N_0 is r*(i*q + j*p) + k*p*q, so for each (i, j) the elements form
+    an arithmetic progression with difference p*q starting at r times the combination i*q + j*p.
+    Its residue mod p*q only depends on r mod p*q, and going from r to r + p*q moves its start down by exactly
+    i*q + j*p rows of length p*q, so the residue layout is computed once per residue class of r.
+
+    Attributes:
+        p, q (int): the fixed parameters of the Brieskorn spheres
+        combinations (list[int]): the values i*q + j*p for 0 <= i < p-1 and 0 <= j < q-1, in increasing order
+    '''
+    def __init__(self, p, q):
+        self.p = p
+        self.q = q
+        self.pq = p*q
+        self.combinations = sorted(i*q + j*p for i in range(p-1) for j in range(q-1))
+        self._orders = {}
+
+    def rs(self, r_range):
+        '''
+        Args:
+            r_range (iterable[int]): candidate values of r
+
+        Returns (generator[int]): lazily yields the values of r for which (p, q, r) is a valid triple
+        '''
+        for r in r_range:
+            if sweep.is_valid_triple(self.p, self.q, r):
+                yield r
+
+    def _order(self, r):
+        '''
+        Returns (list[tuple[int, int]]): pairs (residue, combination) sorted by the residue of r*combination mod p*q,
+            shared between every r in the same residue class
+        '''
+        key = r % self.pq
+        if key not in self._orders:
+            self._orders[key] = sorted(((key*m) % self.pq, m) for m in self.combinations)
+        return self._orders[key]
+
+    def layout(self, r):
+        '''
+        Args:
+            r (int): the varying parameter of the Brieskorn sphere
+
+        Returns (list[tuple[int, int]]): pairs (residue, row) for each progression, sorted by residue,
+            where row is the row of length p*q that the progression starts in
+        '''
+        return [(residue, (r*m)//self.pq) for residue, m in self._order(r)]
+
+    def _active(self, layout, row, last_row, last_residue):
+        # the residues of the progressions that have started by this row; only the last row is cut off at N0
+        if row < 0 or row > last_row:
+            return []
+        if row == last_row:
+            return [residue for residue, start in layout if start <= row and residue < last_residue]
+        return [residue for residue, start in layout if start <= row]
+
+    def _row_patterns(self, r):
+        '''
+        Args:
+            r (int): the varying parameter of the Brieskorn sphere
+
+        Returns (generator[tuple[int, list[tuple[int, int]]]]): lazily yields (count, pattern) for each run of consecutive rows
+            of length p*q on which the delta sequence is the same, where pattern lists (position in row, delta) for its nonzero values
+        '''
+        pq = self.pq
+        N0 = tau_extrema_sequence.find_naught(self.p, self.q, r)
+        last_row, last_residue = divmod(N0, pq)
+        if last_row < 0:
+            return
+
+        layout = self.layout(r)
+        starts = set(start for _, start in layout)
+
+        # row b gets 1 at the progressions active in row b, and -1 at the reflections of those active in rows last_row - b
+        # and last_row - b - 1, so the pattern can only change when one of these three rows crosses the start of a progression
+        breaks = set([0, 1, last_row, last_row + 1])
+        for start in starts:
+            breaks.update([start, last_row + 1 - start, last_row - start])
+        breaks = sorted(b for b in breaks if 0 <= b <= last_row + 1)
+
+        for row, next_row in zip(breaks, breaks[1:]):
+            ups = self._active(layout, row, last_row, last_residue)
+            downs = [last_residue - residue for residue in reversed(self._active(layout, last_row - row, last_row, last_residue)) if residue <= last_residue]
+            downs += [pq + last_residue - residue for residue in reversed(self._active(layout, last_row - row - 1, last_row, last_residue)) if residue > last_residue]
+            pattern = sorted([(x, 1) for x in ups] + [(x, -1) for x in downs])
+            yield next_row - row, pattern
+
+    def semigroup(self, r):
+        '''
+        Args:
+            r (int): the varying parameter of the Brieskorn sphere
+
+        Returns (generator[int]): lazily yields the same elements as tau_extrema_sequence.iter_semigroup(p, q, r)
+        '''
+        row = 0
+        for count, pattern in self._row_patterns(r):
+            ups = [x for x, step in pattern if step == 1]
+            for _ in range(count):
+                offset = row*self.pq
+                yield from [offset + x for x in ups]
+                row += 1
+
+    def _middle(self, r):
+        # the row and position in the row of tau_extrema_sequence.find_middle, before which the delta sequence determines the rest
+        return divmod(tau_extrema_sequence.find_middle(self.p, self.q, r), self.pq)
+
+    def extrema_sequence(self, r, half=True):
+        '''
+        Args:
+            r (int): the varying parameter of the Brieskorn sphere
+            half (bool): an optional argument to only walk the rows before the middle of the delta sequence
+                and complete the extrema with tau_extrema_sequence.reflect_extrema
+
+        Returns (list[int]): the same list as tau_extrema_sequence.extrema_sequence(p, q, r); runs of identical rows
+            are handled by shifting the extrema of a single row instead of walking through every step
+        '''
+        extrema = []
+        value = 0
+        direction = -1
+        middle_row, middle_position = self._middle(r) if half else (math.inf, 0)
+        row = 0
+
+        for count, pattern in self._row_patterns(r):
+            middle = None
+            if row + count > middle_row:
+                # only the rows before the middle row are walked, and then the beginning of the middle row
+                middle = [step for x, step in pattern if x < middle_position]
+                count = middle_row - row
+            row += count
+
+            if len(pattern) > 0 and count > 0:
+                # the first row of a run is walked step by step, as in tau_extrema_sequence.iter_extrema
+                for _, step in pattern:
+                    if step != direction:
+                        extrema.append(value)
+                        direction = step
+                    value += step
+
+                # every later row of the run enters in the direction the previous one left in,
+                # so it has the same extrema relative to its starting value
+                template = []
+                relative = 0
+                for _, step in pattern:
+                    if step != direction:
+                        template.append(relative)
+                        direction = step
+                    relative += step
+
+                for _ in range(count - 1):
+                    extrema.extend([value + t for t in template])
+                    value += relative
+
+            if middle is not None:
+                for step in middle:
+                    if step != direction:
+                        extrema.append(value)
+                        direction = step
+                    value += step
+                break
+
+        if half:
+            return tau_extrema_sequence.reflect_extrema(extrema, value)
+        if direction == -1:
+            extrema.append(value)
+        return extrema
+
+    def truncated_extrema_sequence(self, r, k):
+        '''
+        Args:
+            r (int): the varying parameter of the Brieskorn sphere
+            k (int): the number of gradings to keep, counted up from the minimum of the tau sequence
+
+        Returns (tuple of 2): the ceiling, k above the minimum of the tau sequence, and the extrema sequence with every maximum
+            clipped to the ceiling and every excursion that stays at or above the ceiling removed; the graded root has the same layers
+            below the ceiling, e.g. graded_roots.build_compact_graph(truncated, ceiling) matches build_compact_graph(full, ceiling).
+            Rows that stay at or above the ceiling are skipped without walking through them
+        '''
+        if k < 1:
+            raise ValueError(f'at least one grading must be kept, got k = {k}')
+        ceiling = self.tau_minimum(r) + k
+
+        # tau always starts by going up from 0, which is kept even when it is above the ceiling
+        extrema = [0]
+        last_max = False
+
+        def keep(value, is_max):
+            # a minimum at or above the ceiling is dropped, which merges the maxima on either side of it into one clipped maximum
+            nonlocal last_max
+            if is_max:
+                if not last_max:
+                    extrema.append(min(value, ceiling))
+                    last_max = True
+            elif value < ceiling:
+                extrema.append(value)
+                last_max = False
+
+        value = 0
+        direction = 1
+
+        for count, pattern in self._row_patterns(r):
+            if len(pattern) == 0:
+                continue
+            steps = [step for _, step in pattern]
+            relative = sum(steps)
+            low = min(itertools.accumulate(steps, initial=0))
+
+            # row j of the run gets down to value + j*relative + low, so the rows that reach below the ceiling form one interval
+            if relative == 0:
+                dipping = (0, count) if value + low < ceiling else (0, 0)
+            elif relative > 0:
+                dipping = (0, max(0, min(count, -((value + low - ceiling)//relative))))
+            else:
+                dipping = (max(0, min(count, (ceiling - value - low)//relative + 1)), count)
+            segments = [(dipping[0], False), (dipping[1] - dipping[0], True), (count - dipping[1], False)]
+
+            for rows, dips in segments:
+                if rows == 0:
+                    continue
+
+                if not dips:
+                    # every extremum of these rows is at or above the ceiling, so at most one clipped maximum survives
+                    turns = zip([direction] + steps, steps) if rows == 1 else zip([direction] + steps + steps[-1:], steps + steps)
+                    if any(before == 1 and after == -1 for before, after in turns):
+                        keep(ceiling, True)
+                    value += rows*relative
+                    direction = steps[-1]
+                    continue
+
+                # the first row is walked step by step, and every later row has the same extrema relative to its starting value
+                for step in steps:
+                    if step != direction:
+                        keep(value, direction == 1)
+                        direction = step
+                    value += step
+
+                template = []
+                relative_value = 0
+                for step in steps:
+                    if step != direction:
+                        template.append((relative_value, direction == 1))
+                        direction = step
+                    relative_value += step
+
+                for _ in range(rows - 1):
+                    for t, is_max in template:
+                        keep(value + t, is_max)
+                    value += relative
+
+        if direction == -1:
+            extrema.append(value)
+        return ceiling, extrema
+
+    def tau_minimum(self, r, half=True):
+        '''
+        Args:
+            r (int): the varying parameter of the Brieskorn sphere
+            half (bool): an optional argument to stop after the run containing the middle of the delta sequence;
+                tau is symmetric, so its minimum is reached before the middle
+
+        Returns (int): the minimum of the tau sequence, in time independent of the length of runs of identical rows
+        '''
+        value = 0
+        minimum = 0
+        middle_row = self._middle(r)[0] if half else math.inf
+        row = 0
+
+        for count, pattern in self._row_patterns(r):
+            if row > middle_row:
+                break
+            row += count
+            relative = 0
+            low = 0
+            for _, step in pattern:
+                relative += step
+                if relative < low:
+                    low = relative
+
+            # every row of the run drifts by the same amount, so the lowest point is in its first or last row
+            minimum = min(minimum, value + low, value + (count-1)*relative + low)
+            value += count*relative
+
+        return minimum
+
+    def extrema_sequences(self, r_range):
+        '''
+        Args:
+            r_range (iterable[int]): candidate values of r
+
+        Returns (generator[tuple[int, list[int]]]): lazily yields (r, extrema sequence) for every valid r in r_range
+        '''
+        for r in self.rs(r_range):
+            yield r, self.extrema_sequence(r)
+
+    def shifts(self, r, count):
+        '''
+        Args:
+            r (int): the varying parameter of the first Brieskorn sphere
+            count (int): the number of shifts by p*q to take
+
+        Returns (generator[tuple[int, list[int]]]): lazily yields (r + t*p*q, extrema sequence) for t = 0, ..., count-1,
+            which all share one residue layout
+        '''
+        for t in range(count):
+            yield r + t*self.pq, self.extrema_sequence(r + t*self.pq)
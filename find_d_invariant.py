@@ -1,5 +1,9 @@
-import tau_extrema_sequence
+import family
+import instrument
+import sweep
+import triple_cache
 import math
+from fractions import Fraction
 
 def find_constants(p,q,r):
 	'''
@@ -13,8 +17,8 @@ def find_constants(p,q,r):
 	qprime = q-pow(p*r, -1, q)
 	rprime = r-pow(p*q, -1, r)
 
-	# compute e_0
-	e_0 = int((-1*pprime*q*r - p*qprime*r - p*q*rprime - 1)/(p*q*r))
+	# compute e_0, truncating the negative quotient towards zero in exact integer arithmetic
+	e_0 = -((pprime*q*r + p*qprime*r + p*q*rprime + 1)//(p*q*r))
 	consts = (e_0, pprime, qprime, rprime)
 	return consts
 
@@ -23,15 +27,20 @@ def dedekind(p,q):
 	Args:
 		p, q (int): parameters of the Dedekind sum s(p,q) to be computed
 
-	Returns (float): the Dedekind sum s(p,q)
+	Returns (Fraction): the Dedekind sum s(p,q), computed exactly in O(log q) steps
 	'''
-	if p == 1 and q == 1:
-		return 0
-	if p > q:
-		return dedekind(p-q,q)
-	else:
-		# use the recursive Dedekind reciprocity law
-		return -0.25 + 1/12 * (p/q + q/p + 1/(p*q)) - dedekind(q,p)
+	total = Fraction(0)
+	sign = 1
+
+	# s(p,q) only depends on p mod q, and the Dedekind reciprocity law relates s(p,q) to s(q,p),
+	# so we can follow the Euclidean algorithm down to s(p,1) = 0
+	while q != 1:
+		p %= q
+		total += sign*(Fraction(-1, 4) + Fraction(p*p + q*q + 1, 12*p*q))
+		sign = -sign
+		p, q = q, p
+
+	return total
 
 def find_d_invariant(p,q,r):
 	'''
@@ -45,15 +54,86 @@ def find_d_invariant(p,q,r):
 	assert math.gcd(q,r) == 1, "q and r are not relatively prime"
 	assert math.gcd(r,p) == 1, "r and p are not relatively prime"
 
-	consts = find_constants(p,q,r)
-	e = -1.0/(p*q*r)
+	with instrument.stage('find_d_invariant', p=p, q=q, r=r, N0=p*q*r-p*q-q*r-r*p):
+		consts = find_constants(p,q,r)
+		tau_min = triple_cache.tau_minimum(p,q,r)
+
+		return d_from_invariants(p,q,r, dedekind(consts[1],p) + dedekind(consts[2],q) + dedekind(consts[3],r), tau_min)
+
+def d_from_invariants(p,q,r,dedekind_sum,tau_min):
+	'''
+	Args:
+		p, q, r (int): parameters of the Brieskorn sphere
+		dedekind_sum (Fraction): the sum of the Dedekind sums s(pprime,p) + s(qprime,q) + s(rprime,r)
+		tau_min (int): the global minimum of the tau sequence
+
+	Returns (int): the d-invariant of the Brieskorn sphere
+	'''
+	e = Fraction(-1, p*q*r)
 	N0 = p*q*r - p*q - q*r - p*r 
-	tau_min = min(tau_extrema_sequence.compute_tau(p,q,r))
 
 	# use the formula due to Nemethi, Nicolaescu (2002) for the d-invariant based on the important constants, Dedekind sums, and the global minima of the tau sequence
-	ans = (1/4)*(N0*N0*e + e + 5 - 12*(dedekind(consts[1],p) + dedekind(consts[2],q) + dedekind(consts[3],r))) - 2*tau_min
+	ans = Fraction(1, 4)*(N0*N0*e + e + 5 - 12*dedekind_sum) - 2*tau_min
 	return int(round(ans))
 
+TABLE_COLUMNS = ('p', 'q', 'r', 'e_0', 'pprime', 'qprime', 'rprime', 'd')
+
+def _family_rows(p,q,rs):
+	'''
+	Args:
+		p, q (int): the fixed parameters of the Brieskorn spheres
+		rs (tuple[int]): the values of r
+
+	Returns (list[tuple of 5 ints]): the rows (e_0, pprime, qprime, rprime, d) for (p, q, r), for each r in rs
+	'''
+	# the inverses of q*r mod p and p*r mod q only depend on r mod p and r mod q,
+	# and the Dedekind sums s(pprime,p) and s(qprime,q) only on pprime and qprime, so we tabulate them once per family
+	pprimes = [p-pow(q*x, -1, p) if math.gcd(x, p) == 1 else None for x in range(p)]
+	qprimes = [q-pow(p*x, -1, q) if math.gcd(x, q) == 1 else None for x in range(q)]
+	dedekind_p = [dedekind(x, p) if math.gcd(x, p) == 1 else None for x in range(p+1)]
+	dedekind_q = [dedekind(x, q) if math.gcd(x, q) == 1 else None for x in range(q+1)]
+
+	# one family serves every r, also those below q; the tau minima and the Dedekind sums s(rprime,r) are the per-r work left,
+	# and they take nearly all of the time, so the constants are looked up in these tables rather than computed as arrays
+	brieskorn_family = family.BrieskornFamily(p,q)
+
+	rows = []
+	for r in rs:
+		pprime = pprimes[r % p]
+		qprime = qprimes[r % q]
+		rprime = r-pow(p*q, -1, r)
+		e_0 = -((pprime*q*r + p*qprime*r + p*q*rprime + 1)//(p*q*r))
+
+		tau_min = brieskorn_family.tau_minimum(r)
+
+		d = d_from_invariants(p,q,r, dedekind_p[pprime] + dedekind_q[qprime] + dedekind(rprime, r), tau_min)
+		rows.append((e_0, pprime, qprime, rprime, d))
+
+	return rows
+
+def d_invariant_table(triples, processes=1):
+	'''
+	Args:
+		triples (iterable[tuple[int, int, int]]): the valid triples to compute, e.g. the output of sweep.brieskorn_triples
+		processes (int): an optional argument to specify the number of worker processes; each family of fixed p, q is handled by one worker
+
+	Returns (dict[str, list[int]]): a columnar table with the columns TABLE_COLUMNS, with one row per triple in the given order
+	'''
+	triples = [tuple(triple) for triple in triples]
+
+	# group the triples into families with fixed p, q, which share all of the work that only depends on p and q
+	families = {}
+	for index, (p,q,r) in enumerate(triples):
+		families.setdefault((p,q), []).append(index)
+
+	tasks = [(p, q, tuple(triples[index][2] for index in indices)) for (p,q), indices in families.items()]
+	rows = [None]*len(triples)
+	for (p,q,_), family_rows in sweep.sweep(_family_rows, tasks, processes=processes):
+		for index, row in zip(families[(p,q)], family_rows):
+			rows[index] = triples[index] + row
+
+	return {column: [row[i] for row in rows] for i, column in enumerate(TABLE_COLUMNS)}
+
 def main():
 	# p = int(input("p: "))
 	# q = int(input("q: "))
@@ -64,13 +144,10 @@ def main():
 
 	N=50
 
-	for a in range(2, 3):
-		for b in range(a+1,N):
-			if math.gcd(a,b) == 1:
-				for c in range(1,b+1+a*b):
-					if math.gcd(a,c) == 1 and math.gcd(b,c) == 1:
-						if not (a == 2 and b == 3 and c == 5):
-							print(f'{a}, {b}, {c}: {find_d_invariant(a,b,c)}')            
+	triples = sweep.brieskorn_triples(range(2, 3), lambda a: range(a+1,N), lambda a, b: range(1,b+1+a*b))
+
+	for (a,b,c), d in sweep.sweep(find_d_invariant, triples):
+		print(f'{a}, {b}, {c}: {d}')
 
 if __name__ == "__main__":
 	main()
\ No newline at end of file
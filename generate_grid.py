@@ -1,65 +1,109 @@
+import os
+import argparse
 import xlsxwriter
-from math import ceil
 import find_d_invariant
+import sweep
 
-p = (int)(input("p:"))
-q = (int)(input("q:"))
-r = (int)(input("r:"))
+try:
+    import numpy as np
+except ImportError:
+    # numpy is only used to vectorize Delta over each block of rows
+    np = None
 
-workbook = xlsxwriter.Workbook('sheet for ' + str(p) + ', ' + str(q) + ', ' + str(r) + '.xlsx')
-worksheet = workbook.add_worksheet('sheet')
-format_one_bold = workbook.add_format(properties={'bg_color': 'lime', 'bold': True})
-format_one = workbook.add_format(properties={'bg_color': 'lime'})
-format_two = workbook.add_format(properties={'bg_color': 'green'})
-format_two_bold = workbook.add_format(properties={'bg_color': 'green', 'bold': True})
-format_neg_one = workbook.add_format(properties={'bg_color': 'pink'})
-format_neg_one_bold = workbook.add_format(properties={'bg_color': 'pink', 'bold': True})
-format_neg_two = workbook.add_format(properties={'bg_color': 'red'})
-format_neg_two_bold = workbook.add_format(properties={'bg_color': 'red', 'bold': True})
-format_zero_bold = workbook.add_format(properties={'bold': True})
+# background colors of the cells by their value of Delta; cells with other values are left empty
+COLORS = {1: 'lime', 2: 'green', 0: None, -1: 'pink', -2: 'red'}
 
-naught = p*q*r-p*q-p*r-q*r
+def find_delta(p,q,r,n,consts=None):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        n (int): the index to evaluate Delta at
+        consts (tuple of 4 ints): an optional argument to pass in find_d_invariant.find_constants(p,q,r) instead of recomputing it
 
+    Returns (int): the value of the Delta function at n
+    '''
+    if consts is None:
+        consts = find_d_invariant.find_constants(p,q,r)
+    # ceil(a/b) = -((-a)//b) keeps everything in exact integer arithmetic
+    return 1 - consts[0] * n + (-n*consts[1])//p + (-n*consts[2])//q + (-n*consts[3])//r
 
-def find_delta(p,q,r,n):
+def delta_block(p,q,r,start,stop,consts):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        start, stop (int): the range of indices to evaluate Delta at
+        consts (tuple of 4 ints): output of find_d_invariant.find_constants(p,q,r)
+
+    Returns (list[int]): the values of Delta at start, ..., stop-1, vectorized with numpy when it is available
+    '''
+    if np is None:
+        return [find_delta(p,q,r,n,consts) for n in range(start, stop)]
+
+    n = np.arange(start, stop, dtype=np.int64)
+    delta = 1 - consts[0] * n + (-n*consts[1])//p + (-n*consts[2])//q + (-n*consts[3])//r
+    return delta.tolist()
+
+def generate_grid(p,q,r,save_dir='.',block_rows=256):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        save_dir (str): an optional argument to specify a directory to save the .xlsx file; defaults to current directory
+        block_rows (int): an optional argument to specify how many rows of Delta are computed at a time
+
+    Returns (str): the path of the saved spreadsheet, which has one row of p*q cells for each block of p*q indices up to N0,
+        colored by the value of Delta and bold on rows where Delta sums to a negative number
+    '''
+    pq = p*q
     consts = find_d_invariant.find_constants(p,q,r)
-    return 1 - consts[0] * n - ceil((n*consts[1])/p) - ceil((n*consts[2])/q) - ceil((n*consts[3])/r)
-
-delta_list = []
-
-for i in range(((int)(naught/(p*q)) + 1)*p*q + 1):
-    delta_list.append(find_delta(p,q,r,i))
-
-rowsums = []
-for i in range(((int)(naught/(p*q))) + 1):
-    sum = 0
-    for j in range(p*q):
-        sum += delta_list[i*p*q+j]
-    rowsums.append(sum)
-
-for i in range((int)((naught/(p*q))) + 1):
-    for j in range(p*q):
-        if rowsums[i] >= 0:
-            if delta_list[i * p * q + j] == 1:
-                worksheet.write(i, j, i * p * q + j, format_one)
-            if delta_list[i * p * q + j] == 2:
-                worksheet.write(i, j, i * p * q + j, format_two)
-            if delta_list[i * p * q + j] == 0:
-                worksheet.write(i, j, i * p * q + j)
-            if delta_list[i * p * q + j] == -1:
-                worksheet.write(i, j, i * p * q + j, format_neg_one)
-            if delta_list[i * p * q + j] == -2:
-                worksheet.write(i, j, i * p * q + j, format_neg_two)
-        else:
-            if delta_list[i * p * q + j] == 1:
-                worksheet.write(i, j, i * p * q + j, format_one_bold)
-            if delta_list[i * p * q + j] == 2:
-                worksheet.write(i, j, i * p * q + j, format_two_bold)
-            if delta_list[i * p * q + j] == 0:
-                worksheet.write(i, j, i * p * q + j, format_zero_bold)
-            if delta_list[i * p * q + j] == -1:
-                worksheet.write(i, j, i * p * q + j, format_neg_one_bold)
-            if delta_list[i * p * q + j] == -2:
-                worksheet.write(i, j, i * p * q + j, format_neg_two_bold)
-
-workbook.close()
+    naught = p*q*r-p*q-p*r-q*r
+    num_rows = naught//pq + 1
+
+    path = os.path.join(save_dir, 'sheet for ' + str(p) + ', ' + str(q) + ', ' + str(r) + '.xlsx')
+
+    # constant memory mode streams each row to disk once the next one starts, so rows must be written in order
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('sheet')
+
+    formats = {}
+    for value, color in COLORS.items():
+        plain = workbook.add_format(properties={'bg_color': color}) if color is not None else None
+        bold = workbook.add_format(properties={'bg_color': color, 'bold': True} if color is not None else {'bold': True})
+        formats[value] = (plain, bold)
+
+    for block_start in range(0, num_rows, block_rows):
+        block_stop = min(block_start + block_rows, num_rows)
+        deltas = delta_block(p,q,r, block_start*pq, block_stop*pq, consts)
+
+        for i in range(block_start, block_stop):
+            row = deltas[(i-block_start)*pq:(i-block_start+1)*pq]
+            bold = sum(row) < 0
+            for j, delta in enumerate(row):
+                if delta in formats:
+                    cell_format = formats[delta][1 if bold else 0]
+                    if cell_format is None:
+                        worksheet.write(i, j, i * pq + j)
+                    else:
+                        worksheet.write(i, j, i * pq + j, cell_format)
+
+    workbook.close()
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the pictorial grid representation of Delta into Excel spreadsheets.')
+    parser.add_argument('triples', nargs='*', help='triples to generate grids for, written as p,q,r')
+    parser.add_argument('--file', help='file with one triple per line')
+    parser.add_argument('--save-dir', default='.', help='directory to save the spreadsheets in')
+    parser.add_argument('--block-rows', type=int, default=256, help='number of rows of Delta computed at a time')
+    args = parser.parse_args(argv)
+
+    triples = [tuple(int(part) for part in triple.split(',')) for triple in args.triples]
+    if args.file is not None:
+        triples += sweep.read_triples(args.file)
+    if not triples:
+        parser.error('no triples given')
+
+    for p, q, r in triples:
+        print(generate_grid(p,q,r,save_dir=args.save_dir,block_rows=args.block_rows))
+
+if __name__ == "__main__":
+    main()
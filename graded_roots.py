@@ -1,12 +1,30 @@
 import os
+import sys
 import math
-import networkx as nx
-import matplotlib.pyplot as plt
-from networkx.classes.function import subgraph
-from regex import F
+import hashlib
+import bisect
+from array import array
 
+import family
+import instrument
+import sweep
 import tau_extrema_sequence
+import triple_cache
 
+def _plotting():
+    '''
+    Returns (tuple of 2): the networkx and matplotlib.pyplot modules, which are only imported by the drawing functions
+        so that the computations here do not pay for them; matplotlib uses the headless Agg backend
+        unless a backend was already chosen
+    '''
+    import matplotlib
+    if 'matplotlib.pyplot' not in sys.modules and 'MPLBACKEND' not in os.environ:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    return nx, plt
+
+@instrument.timed('draw_lattice_homology')
 def draw_lattice_homology(tau_extrema, cutoff=100, name=None, save_dir='.'):
     '''
     Args:
@@ -50,6 +68,7 @@ def draw_lattice_homology(tau_extrema, cutoff=100, name=None, save_dir='.'):
     # minimum grading, for cutoff purposes
     min_grading = min(counts.keys())
 
+    nx, plt = _plotting()
     G = nx.Graph()
     subgraph_nodes = []
 
@@ -102,6 +121,7 @@ def draw_lattice_homology(tau_extrema, cutoff=100, name=None, save_dir='.'):
         plt.savefig('lattice_homology.png')
     else:
         plt.savefig(os.path.join(save_dir, f'lattice_homology_for_{name}.png'))
+    plt.close()
     
 class Node:
     '''
@@ -140,6 +160,7 @@ class Graph:
         self.dir = dir
         self.counts = counts
 
+@instrument.timed('build_graph', lambda graph, tau_extrema: {'extrema': len(tau_extrema), 'vertices': len(graph.dir)})
 def build_graph(tau_extrema):
     # top is one layer above the top node
     top = int(round(max(tau_extrema)))+2
@@ -209,7 +230,305 @@ def build_graph(tau_extrema):
     
     return Graph(dir[(top-1, 0)], last_stem_node, dir, counts)
 
-def maximal_monotone_subroot(tau_extrema):
+class CompactGraph:
+    '''
+    Class which represents the lattice homology as flat arrays instead of Node objects;
+    vertex v is the vertex with index v - offsets[layer - min_layer] on its layer
+
+    Attributes:
+        min_layer (int): the lowest layer of the graph
+        top (int): one layer above the root
+        counts (array[int]): the number of vertices on each layer, indexed by layer - min_layer
+        offsets (array[int]): the first vertex on each layer, indexed by layer - min_layer, followed by the total number of vertices
+        parents (array[int]): the parent of each vertex, or -1 for the root
+        stem_end (int): the layer of the last node on the central stem
+    '''
+    def __init__(self, min_layer, top, counts, offsets, parents, stem_end):
+        self.min_layer = min_layer
+        self.top = top
+        self.counts = counts
+        self.offsets = offsets
+        self.parents = parents
+        self.stem_end = stem_end
+
+    def __len__(self):
+        return len(self.parents)
+
+    def layers(self):
+        return range(self.min_layer, self.top)
+
+    def rank(self, layer):
+        '''
+        Returns (int): the number of vertices with grading layer
+        '''
+        if layer < self.min_layer or layer >= self.top:
+            return 0
+        return self.counts[layer - self.min_layer]
+
+    def vertex(self, layer, index):
+        '''
+        Returns (int): the vertex with the given index on the given layer
+        '''
+        if not 0 <= index < self.rank(layer):
+            raise IndexError(f'no vertex {index} on layer {layer}')
+        return self.offsets[layer - self.min_layer] + index
+
+    def layer_of(self, vertex):
+        return self.min_layer + bisect.bisect_right(self.offsets, vertex) - 1
+
+    def index_of(self, vertex):
+        return vertex - self.offsets[self.layer_of(vertex) - self.min_layer]
+
+    def root(self):
+        return self.vertex(self.top - 1, 0)
+
+    def stem_vertex(self, layer):
+        '''
+        Returns (int): the vertex on the central stem on the given layer, which must be at least stem_end
+        '''
+        if layer < self.stem_end:
+            raise IndexError(f'the stem ends at layer {self.stem_end}, above layer {layer}')
+        return self.vertex(layer, (self.rank(layer) - 1)//2)
+
+    def stem(self):
+        '''
+        Returns (list[int]): the vertices on the central stem, from the end of the stem up to the root
+        '''
+        return [self.stem_vertex(layer) for layer in range(self.stem_end, self.top)]
+
+    def children(self, vertex):
+        '''
+        Returns (range): the children of vertex; the tree is planar, so the parents on each layer are sorted
+            and the children of any vertex are consecutive on the layer below
+        '''
+        layer = self.layer_of(vertex)
+        if layer == self.min_layer:
+            return range(0)
+        start = self.offsets[layer - 1 - self.min_layer]
+        stop = self.offsets[layer - self.min_layer]
+        return range(bisect.bisect_left(self.parents, vertex, start, stop), bisect.bisect_right(self.parents, vertex, start, stop))
+
+    def subtree(self, vertex):
+        '''
+        Returns (generator[range]): the vertices in the subtree of vertex, as one range of consecutive vertices per layer from the top down
+        '''
+        layer = self.layer_of(vertex)
+        current = range(vertex, vertex + 1)
+        while len(current) > 0:
+            yield current
+            layer -= 1
+            if layer < self.min_layer:
+                break
+            start = self.offsets[layer - self.min_layer]
+            stop = self.offsets[layer + 1 - self.min_layer]
+            current = range(bisect.bisect_left(self.parents, current.start, start, stop), bisect.bisect_left(self.parents, current.stop, start, stop))
+
+    def branch_depths(self):
+        '''
+        Returns (dict[int, int]): dict from each stem layer to the lowest layer reached by the branches hanging off of the stem node on that layer
+        '''
+        # propagate the lowest layer in each subtree up to the parents, layer by layer from the bottom,
+        # except that the stem nodes do not pass their depth on to the stem node above them
+        depths = array('q', [self.top])*len(self.parents)
+        for layer in self.layers():
+            start = self.offsets[layer - self.min_layer]
+            stop = self.offsets[layer + 1 - self.min_layer]
+            stem = self.stem_vertex(layer) if layer >= self.stem_end else -1
+            for vertex in range(start, stop):
+                if layer < depths[vertex]:
+                    depths[vertex] = layer
+                parent = self.parents[vertex]
+                if parent != -1 and vertex != stem and depths[vertex] < depths[parent]:
+                    depths[parent] = depths[vertex]
+
+        return {layer: depths[self.stem_vertex(layer)] for layer in range(self.stem_end, self.top)}
+
+    def maximal_monotone_subroot(self):
+        return monotone_subroot_from_branch_depths(self.branch_depths().items())
+
+@instrument.timed('build_compact_graph', lambda graph, tau_extrema, ceiling=None: {'extrema': len(tau_extrema), 'vertices': len(graph)})
+def build_compact_graph(tau_extrema, ceiling=None):
+    '''
+    Args:
+        tau_extrema (list[int]): list of local extrema of a tau sequence,
+            output of tau_extrema_sequence.extrema_sequence or family.BrieskornFamily.truncated_extrema_sequence
+
+        ceiling (int): an optional argument to only build the layers below ceiling, with every vertex on the layer below it
+            hanging from a single root on the ceiling, which is the graded root of min(tau, ceiling)
+
+    Returns (CompactGraph): the lattice homology, with the same vertices and edges as build_graph below the ceiling,
+        built in time linear in the number of vertices without any per-node objects
+    '''
+    extrema = [int(round(value)) for value in tau_extrema]
+
+    # top is one layer above the top node
+    top = max(extrema)+2
+    min_layer = min(extrema)
+    if ceiling is not None:
+        if ceiling <= min_layer:
+            raise ValueError(f'the ceiling {ceiling} must be above the lowest layer {min_layer}')
+        top = min(top, ceiling+1)
+    root_layer = top-1
+
+    # count the nodes on each layer with a difference array: the stem above 0, an extra node on layer 0,
+    # and each max_val -> min_val adds nodes to the layers between; everything is cut off below the root layer, which has just the root
+    diff = array('q', bytes(8*(top - min_layer + 1)))
+    if root_layer > 0:
+        diff[0 - min_layer] += 2
+        diff[1 - min_layer] -= 1
+        diff[root_layer - min_layer] -= 1
+    diff[root_layer - min_layer] += 1
+    diff[top - min_layer] -= 1
+
+    length = (len(extrema)-1)//2
+    for i in range(1, length):
+        if extrema[2*i] < root_layer:
+            diff[extrema[2*i] - min_layer] += 1
+            diff[min(extrema[2*i-1], root_layer) - min_layer] -= 1
+
+    counts = array('q', bytes(8*(top - min_layer)))
+    offsets = array('q', bytes(8*(top - min_layer + 1)))
+    running = 0
+    for k in range(top - min_layer):
+        running += diff[k]
+        counts[k] = running
+        offsets[k+1] = offsets[k] + running
+
+    # same traversal as build_graph, except the pointers hold vertices rather than indices within a layer
+    parents = array('q', [-1])*offsets[-1]
+    pointers = offsets[:-1]
+
+    for i in range(len(extrema)):
+        if i == 0:
+            for j in range(extrema[0], root_layer):
+                parents[pointers[j - min_layer]] = pointers[j + 1 - min_layer]
+
+        elif i % 2 == 0:
+            for j in range(extrema[i], min(extrema[i-1], root_layer)):
+                parents[pointers[j - min_layer]] = pointers[j + 1 - min_layer]
+
+        else:
+            for j in range(extrema[i-1], min(extrema[i], root_layer)):
+                pointers[j - min_layer] += 1
+
+    #default value
+    stem_end = min_layer
+
+    for layer in range(top-1, min_layer-1, -1):
+        if counts[layer - min_layer] % 2 == 0:
+            stem_end = layer + 1
+            break
+
+    return CompactGraph(min_layer, top, counts, offsets, parents, stem_end)
+
+def truncated_compact_graph(p, q, r, k):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        k (int): the number of gradings to keep, counted up from the bottom of the lattice homology
+
+    Returns (CompactGraph): the bottom k layers of the lattice homology under a single root, built from
+        family.BrieskornFamily.truncated_extrema_sequence without computing the excursions of tau above them;
+        the same truncated extrema can be drawn with render.render_lattice_homology(extrema, cutoff=k)
+    '''
+    p, q, r = family.canonical_triple(p,q,r)
+    ceiling, extrema = family.BrieskornFamily(p,q).truncated_extrema_sequence(r, k)
+    return build_compact_graph(extrema, ceiling)
+
+@instrument.timed('maximal_monotone_subroot', lambda subroot, tau_extrema, naive=False: {'extrema': len(tau_extrema), 'stem_layers': len(subroot)})
+def maximal_monotone_subroot(tau_extrema, naive=False):
+    '''
+    Args:
+        tau_extrema (list[int]): list of local extrema of a tau sequence,
+            output of tau_extrema_sequence.extrema_sequence; unless naive is set, it must be a palindrome,
+            as it is for every Brieskorn sphere since tau is symmetric, and a ValueError is raised otherwise
+
+        naive (bool): an optional argument to use the reference implementation,
+            which builds the whole graph and runs a BFS from every stem node and accepts any extrema sequence
+
+    Returns (dict[int, int]): dict from each stem layer to the layer that its branch ends at in the maximal monotone subroot
+        (equal to the layer itself if there is no branch there)
+    '''
+    if naive:
+        return naive_maximal_monotone_subroot(tau_extrema)
+
+    return monotone_subroot_from_branch_depths(stem_branch_depths(tau_extrema))
+
+def monotone_subroot_from_branch_depths(branch_depths):
+    '''
+    Args:
+        branch_depths (iterable[tuple[int, int]]): pairs (layer, depth) for each stem layer in increasing order,
+            where depth is the lowest layer reached by the branches hanging off of the stem node on that layer
+
+    Returns (dict[int, int]): the maximal monotone subroot, in the format of the output of maximal_monotone_subroot
+    '''
+    monotone_subroot = {}
+    current_min_depth = None
+
+    # keep a branch only if it goes strictly deeper than every branch below it on the stem
+    for layer, depth in branch_depths:
+        if current_min_depth is None or depth < current_min_depth:
+            current_min_depth = depth
+            monotone_subroot[layer] = depth
+        else:
+            monotone_subroot[layer] = layer
+
+    return monotone_subroot
+
+def stem_branch_depths(tau_extrema):
+    '''
+    Args:
+        tau_extrema (list[int]): list of local extrema of a tau sequence, output of tau_extrema_sequence.extrema_sequence;
+            it must be a palindrome, and a ValueError is raised otherwise
+
+    Returns (generator[tuple[int, int]]): yields (layer, depth) for each stem layer from the end of the stem up to the root,
+        where depth is the lowest layer reached by the branches hanging off of the stem node on that layer,
+        computed in a single pass without building the graph
+    '''
+    # the tau sequence is symmetric, so the extrema sequence is a palindrome whose middle entry is where the stem ends;
+    # the stem node on each layer is the component of the sublevel set containing the middle of the sequence,
+    # so it suffices to walk outwards from the middle along one half of the sequence
+    center = len(tau_extrema)//2
+    if list(tau_extrema[:center]) != list(tau_extrema[:len(tau_extrema)-center-1:-1]):
+        raise ValueError('the extrema sequence is not a palindrome; use naive=True for extrema that do not come from a symmetric tau sequence')
+
+    top = int(round(max(tau_extrema)))+1
+
+    if len(tau_extrema) == 1:
+        # tau is constant, and as in build_graph both of its ends are separate leaves below the root, which is the only stem layer
+        yield top, top-1
+        return
+
+    # peak is the stem layer whose branches we are currently exploring, low is the deepest layer reached off of it so far
+    peak = int(round(tau_extrema[center]))
+    low = peak
+
+    for value in tau_extrema[center+1:]:
+        value = int(round(value))
+        if value > peak:
+            # we have left the stem node on layer peak, and the layers passed on the way up to value have no branches
+            yield peak, low
+            for layer in range(peak+1, value):
+                yield layer, layer
+            peak = value
+            low = value
+        elif value < low:
+            low = value
+
+    # the last stem layer reached by the sequence, then the rest of the stem up to the root has no branches
+    yield peak, low
+    for layer in range(peak+1, top+1):
+        yield layer, layer
+
+def naive_maximal_monotone_subroot(tau_extrema):
+    '''
+    Args:
+        tau_extrema (list[int]): list of local extrema of a tau sequence,
+            output of tau_extrema_sequence.extrema_sequence
+
+    Returns (dict[int, int]): the maximal monotone subroot, computed by building the whole graph
+        and running a BFS from every stem node; kept as a reference for maximal_monotone_subroot
+    '''
     graph = build_graph(tau_extrema)
 
     #bfs to calculate max branch depths, which are absolute layer numbers
@@ -247,7 +566,9 @@ def maximal_monotone_subroot(tau_extrema):
 
     return monotone_subroot
 
-def draw_monotone_subroot(monotone_subroot, cutoff, name=None, save_dir='new_project'):
+@instrument.timed('draw_monotone_subroot', lambda _, monotone_subroot, *args, **kwargs: {'stem_layers': len(monotone_subroot)})
+def draw_monotone_subroot(monotone_subroot, cutoff, name=None, save_dir='new_project', figsize=(10,50)):
+    nx, plt = _plotting()
     G=nx.Graph()
 
     positions = {}
@@ -294,7 +615,7 @@ def draw_monotone_subroot(monotone_subroot, cutoff, name=None, save_dir='new_pro
         
 
     # plt.figure(figsize=(max_width,max_height))
-    plt.figure(figsize=(10,50))
+    plt.figure(figsize=figsize)
 
     nx.draw_networkx(G.subgraph(subgraph_nodes), pos = positions)
     if (name is None):
@@ -339,6 +660,28 @@ def check_monotone_equivalence(ms1, ms2):
     # compare the resulting dictionaries
     return ms1_new == ms2_new
 
+def monotone_fingerprint(monotone_subroot):
+    '''
+    Args:
+        monotone_subroot (dict[int, int]): dict with layers to layer that branches end at. Format of the output of maximal_monotone_subroot
+
+    Returns (tuple[tuple[int, int]]): canonical form of the subroot, recentered at the highest layer with a branch and
+        with everything above it deleted, as in check_monotone_equivalence; two subroots are equivalent exactly when their fingerprints are equal
+    '''
+    # layer num of the highest layer with a branch
+    top = max([key for key in monotone_subroot.keys() if monotone_subroot[key] != key], default=min(monotone_subroot.keys()))
+
+    return tuple(sorted((key-top, value-top) for key,value in monotone_subroot.items() if key-top <= 0))
+
+def monotone_hash(monotone_subroot):
+    '''
+    Args:
+        monotone_subroot (dict[int, int]): dict with layers to layer that branches end at. Format of the output of maximal_monotone_subroot
+
+    Returns (str): a hash of the fingerprint of the subroot that is stable across runs and machines, unlike the builtin hash
+    '''
+    return hashlib.blake2b(repr(monotone_fingerprint(monotone_subroot)).encode(), digest_size=16).hexdigest()
+
 
 
 def draw_monotone_short(a, b, c, cutoff, shift=False, save_dir=''):
@@ -347,34 +690,65 @@ def draw_monotone_short(a, b, c, cutoff, shift=False, save_dir=''):
     else:
         draw_monotone_subroot(maximal_monotone_subroot(tau_extrema_sequence.extrema_sequence(a,b,c+a*b)), cutoff, name=f'{a}, {b}, {c}+shift', save_dir=save_dir)
 
+def check_shift_conjecture(a, b, c):
+    '''
+    Args:
+        a, b, c (int): parameters of the Brieskorn sphere
+
+    Returns (bool): whether shifting c by a*b changes the maximal monotone subroot of (a, b, c) exactly when
+        it changes the maximal monotone subroot of (a, b, 2*a*b-c); None if (a, b, 2*a*b-c) is the Poincare sphere
+    '''
+    if set([a,b,2*a*b-c]) == set([2,3,5]):
+        return None
+
+    # consecutive values of c share triples, so go through the cache
+    ms1 = triple_cache.maximal_monotone_subroot(a,b,c)
+    ms2 = triple_cache.maximal_monotone_subroot(a,b,c+a*b)
+    ms3 = triple_cache.maximal_monotone_subroot(a,b,2*a*b-c)
+    ms4 = triple_cache.maximal_monotone_subroot(a,b,3*a*b-c)
+
+    return check_monotone_equivalence(ms1, ms2) == check_monotone_equivalence(ms3, ms4)
+
+def write_conjecture_log(a, b_range, f, processes=None, echo=False):
+    '''
+    Args:
+        a (int): the fixed first parameter
+        b_range (iterable[int]): values of b to sweep over, with c in range(2, a*b+1)
+        f (file): the open text file to write the log to
+        processes (int): an optional argument to specify the number of worker processes, as in sweep.sweep
+        echo (bool): an optional argument to also print every line
+
+    Returns (bool): whether the conjecture held for every triple; the log has one line "a, b, c, conj" per triple in increasing b and then c,
+        and stops after the first counterexample with a line naming it
+    '''
+    triples = sweep.brieskorn_triples([a], b_range, lambda a, b: range(2, a*b+1))
+
+    # stop every worker as soon as we find a counterexample
+    for (a,b,c), conj in sweep.sweep(check_shift_conjecture, triples, processes=processes, stop_when=lambda triple, conj: conj is False):
+        if conj is None:
+            continue
+
+        f.write(f'{a}, {b}, {c}, {conj}\n')
+        if echo:
+            print(f'{a}, {b}, {c}', conj)
+        if not conj:
+            f.write(f'OHHHH NOOOO: {a}, {b}, {c}')
+            if echo:
+                print(f'OHHHH NOOOO: {a}, {b}, {c}')
+            return False
+    return True
+
 def main():
     co = 100
     a = 12
     N = 50
 
+    # c and a*b - c share the triples with 2*a*b - c and a*b + c, so keep the subroots in an on-disk tier
+    # that every worker of the sweep reads, rather than only in the memory of the worker that computed them
+    triple_cache.configure(path=f'conjecture_cache_{a}.sqlite')
+
     with open(f'conjecture_log_{a}.txt', 'w') as f:
-        for b in range(a+1,N):
-            if math.gcd(a,b) == 1:
-                for c in range(2, a*b+1):
-                    if math.gcd(a,c) == 1 and math.gcd(b,c) == 1:
-                        if set([a,b,c]) != set([2,3,5]):
-                            ms1 = maximal_monotone_subroot(tau_extrema_sequence.extrema_sequence(a,b,c))
-                            ms2 = maximal_monotone_subroot(tau_extrema_sequence.extrema_sequence(a,b,c+a*b))
-
-                            if set([a,b,2*a*b-c]) != set([2,3,5]):
-                                ms3 = maximal_monotone_subroot(tau_extrema_sequence.extrema_sequence(a,b,2*a*b-c))
-                                ms4 = maximal_monotone_subroot(tau_extrema_sequence.extrema_sequence(a,b,3*a*b-c))
-
-                                conj = check_monotone_equivalence(ms1, ms2) == check_monotone_equivalence(ms3, ms4)
-
-                                
-                                f.write(f'{a}, {b}, {c}, {conj}\n')
-                                print(f'{a}, {b}, {c}', conj)
-                                if not conj:
-                                    f.write(f'OHHHH NOOOO: {a}, {b}, {c}')
-                                    print(f'OHHHH NOOOO: {a}, {b}, {c}')
-                                    break
-                            
+        write_conjecture_log(a, range(a+1,N), f, echo=True)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import functools
+
+# instrumentation is off unless enabled in code or with LATTICE_INSTRUMENT=1 (or =trace to also keep a trace of every call)
+_enabled = os.environ.get('LATTICE_INSTRUMENT', '') not in ('', '0')
+_trace = [] if os.environ.get('LATTICE_INSTRUMENT', '') == 'trace' else None
+_counters = {}
+
+class _NullSpan:
+    '''
+    Class which stands in for a Span while instrumentation is disabled, so that a disabled stage costs one function call
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    '''
+    Class which measures one call of a stage
+
+    Attributes:
+        name (str): the name of the stage
+        sizes (dict[str, int]): sizes recorded for this call, such as N0 or the number of extrema
+        start (float): the wall clock time at which the call started
+        blocks (int): the number of allocated memory blocks when the call started
+    '''
+    def __init__(self, name, sizes):
+        self.name = name
+        self.sizes = sizes
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __setitem__(self, key, value):
+        self.sizes[key] = value
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        blocks = sys.getallocatedblocks() - self.blocks
+        _record(self.name, self.start, elapsed, blocks, self.sizes)
+        return False
+
+def stage(name, **sizes):
+    '''
+    Args:
+        name (str): the name of the stage, e.g. 'extrema_sequence'
+        sizes (int): sizes known at the start of the call, such as p, q, r and N0; more can be set on the span with span[key] = value
+
+    Returns (Span): a context manager measuring the wall time, the net number of allocated blocks and the sizes of the call,
+        or a shared no-op stand-in while instrumentation is disabled
+    '''
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, sizes)
+
+def timed(name, sizes=None):
+    '''
+    Args:
+        name (str): the name of the stage
+        sizes (callable): an optional function called as sizes(output, *args, **kwargs) which returns a dict of sizes to record,
+            such as the number of vertices of a graph
+
+    Returns (callable): a decorator which records every call of the decorated function as one call of the stage;
+        while instrumentation is disabled the only cost is checking a flag
+    '''
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name, {}) as span:
+                output = func(*args, **kwargs)
+                if sizes is not None:
+                    span.sizes.update(sizes(output, *args, **kwargs))
+            return output
+        return wrapper
+    return decorate
+
+def _record(name, start, elapsed, blocks, sizes):
+    counter = _counters.get(name)
+    if counter is None:
+        counter = _counters[name] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'net_blocks': 0, 'sizes': {}}
+    counter['calls'] += 1
+    counter['seconds'] += elapsed
+    counter['max_seconds'] = max(counter['max_seconds'], elapsed)
+    counter['net_blocks'] += blocks
+    for key, value in sizes.items():
+        if key not in ('p', 'q', 'r'):
+            counter['sizes'][key] = counter['sizes'].get(key, 0) + value
+
+    if _trace is not None:
+        args = dict(sizes)
+        args['net_blocks'] = blocks
+        # the trace uses the Chrome trace event format, so it can be opened in chrome://tracing or Perfetto
+        _trace.append({'name': name, 'ph': 'X', 'ts': start*1e6, 'dur': elapsed*1e6, 'pid': os.getpid(), 'tid': 0, 'args': args})
+
+def enable(trace=False):
+    '''
+    Args:
+        trace (bool): an optional argument to also keep an event for every call, rather than only the aggregated counters
+
+    Returns (None): turns instrumentation on in this process; worker processes forked afterwards inherit it
+    '''
+    global _enabled, _trace
+    _enabled = True
+    if trace and _trace is None:
+        _trace = []
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    '''
+    Returns (None): forgets every counter and trace event recorded so far
+    '''
+    global _trace
+    _counters.clear()
+    if _trace is not None:
+        _trace = []
+
+def counters():
+    '''
+    Returns (dict[str, dict]): for each stage, the number of calls, the total and largest wall time, the net number of allocated blocks,
+        and the totals of the recorded sizes
+    '''
+    return {name: dict(counter, sizes=dict(counter['sizes'])) for name, counter in _counters.items()}
+
+def drain():
+    '''
+    Returns (tuple of 2): the counters and the trace events recorded since the last drain, which are then forgotten,
+        so that a pool worker can send what it recorded back with each result; None while instrumentation is disabled
+    '''
+    if not _enabled:
+        return None
+    recorded = (counters(), _trace or [])
+    reset()
+    return recorded
+
+def merge(other, trace=()):
+    '''
+    Args:
+        other (dict[str, dict]): output of counters() in another process, e.g. returned from a pool worker by drain
+        trace (list[dict]): an optional argument with the trace events of the other process
+
+    Returns (None): adds the other counters into the counters of this process, and the events into its trace if it keeps one
+    '''
+    if _trace is not None:
+        _trace.extend(trace)
+    for name, theirs in other.items():
+        counter = _counters.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'net_blocks': 0, 'sizes': {}})
+        counter['calls'] += theirs['calls']
+        counter['seconds'] += theirs['seconds']
+        counter['max_seconds'] = max(counter['max_seconds'], theirs['max_seconds'])
+        counter['net_blocks'] += theirs['net_blocks']
+        for key, value in theirs['sizes'].items():
+            counter['sizes'][key] = counter['sizes'].get(key, 0) + value
+
+def write_trace(path):
+    '''
+    Args:
+        path (str): where to write the JSON trace
+
+    Returns (None): writes the recorded events and the aggregated counters as JSON
+    '''
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': _trace or [], 'counters': counters()}, f)
@@ -0,0 +1,242 @@
+import os
+import tempfile
+import numpy as np
+
+import find_d_invariant
+import tau_extrema_sequence
+
+# number of entries of delta held in memory at a time, 16 MiB of int8
+DEFAULT_CHUNK = 1 << 24
+
+def iter_delta_chunks(p,q,r,chunk=DEFAULT_CHUNK,stop=None):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        chunk (int): an optional argument to specify how many entries of delta are built at a time
+        stop (int): an optional argument to stop before this index, e.g. tau_extrema_sequence.find_middle(p,q,r)
+
+    Returns (generator[numpy.ndarray]): lazily yields the delta sequence as consecutive int8 arrays of length at most chunk,
+        built by scatter assignment along each arithmetic progression restricted to the chunk
+    '''
+    N0 = tau_extrema_sequence.find_naught(p,q,r)
+    pq = p*q
+    bases = tau_extrema_sequence.progression_bases(p,q,r)
+    end = N0+1 if stop is None else min(stop, N0+1)
+
+    for lo in range(0, end, chunk):
+        hi = min(lo + chunk, end)
+        delta = np.zeros(hi - lo, dtype=np.int8)
+        for base in bases:
+            # the elements base + k*p*q below N0 that fall in [lo, hi)
+            first = base if base >= lo else base + -((base - lo)//pq)*pq
+            if first < min(hi, N0):
+                delta[first-lo:min(hi, N0)-lo:pq] = 1
+
+            # their reflections N0 - base - k*p*q, which run down to 1
+            top = N0 - base
+            first = max(lo, 1)
+            first += (top - first) % pq
+            if first <= min(hi-1, top):
+                delta[first-lo:min(hi-1, top)+1-lo:pq] = -1
+        yield delta
+
+def _array_chunks(array, chunk):
+    for lo in range(0, len(array), chunk):
+        yield np.asarray(array[lo:lo+chunk])
+
+def _delta_chunks(p,q,r,delta,chunk,stop=None):
+    return iter_delta_chunks(p,q,r,chunk,stop) if delta is None else _array_chunks(delta[:stop], chunk)
+
+def _stop(p,q,r,half):
+    # with half, only the delta sequence before its middle is scanned and the rest follows from delta(N0 - n) = -delta(n)
+    return tau_extrema_sequence.find_middle(p,q,r) if half else None
+
+def write_delta(p,q,r,path,chunk=DEFAULT_CHUNK,half=True):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        path (str): where to write the delta sequence
+        chunk (int): an optional argument to specify how many entries of delta are built at a time
+        half (bool): an optional argument to only build the entries before the middle and copy the rest reversed and negated
+
+    Returns (numpy.memmap): the delta sequence as a memory-mapped int8 file of length N0+1, written one chunk at a time
+    '''
+    N0 = tau_extrema_sequence.find_naught(p,q,r)
+    delta = np.lib.format.open_memmap(path, mode='w+', dtype=np.int8, shape=(max(N0+1, 0),))
+    middle = _stop(p,q,r,half)
+    lo = 0
+    for values in iter_delta_chunks(p,q,r,chunk,middle):
+        delta[lo:lo+len(values)] = values
+        lo += len(values)
+    if half:
+        # the center N0/2, when it is an index, is left at 0
+        for lo in range(0, middle, chunk):
+            hi = min(lo + chunk, middle)
+            delta[N0+1-hi:N0+1-lo] = -delta[lo:hi][::-1]
+    delta.flush()
+    return delta
+
+def write_tau(p,q,r,path,delta=None,chunk=DEFAULT_CHUNK,half=True):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        path (str): where to write the tau sequence
+        delta (numpy.ndarray): an optional argument to pass in the delta sequence, e.g. the output of write_delta,
+            instead of rebuilding it chunk by chunk
+        chunk (int): an optional argument to specify how many entries are summed at a time
+        half (bool): an optional argument to only sum delta up to the middle and copy the rest by tau[N0 + 1 - n] = tau[n]
+
+    Returns (numpy.memmap): the tau sequence as a memory-mapped file of length N0+2 in the smallest dtype that holds it,
+        the running partial sums of delta carried from one chunk to the next
+    '''
+    N0 = tau_extrema_sequence.find_naught(p,q,r)
+    tau = np.lib.format.open_memmap(path, mode='w+', dtype=tau_extrema_sequence._tau_dtype(max(N0, 0)), shape=(max(N0+2, 1),))
+    tau[0] = 0
+    value = 0
+    middle = _stop(p,q,r,half)
+    lo = 1
+    for values in _delta_chunks(p,q,r,delta,chunk,middle):
+        sums = np.cumsum(values, dtype=np.int64)
+        sums += value
+        tau[lo:lo+len(values)] = sums
+        lo += len(values)
+        value = int(sums[-1])
+    if half:
+        # tau[0], ..., tau[N0 - middle] reversed are the rest of the sequence
+        for lo in range(0, N0 - middle + 1, chunk):
+            hi = min(lo + chunk, N0 - middle + 1)
+            tau[N0+2-hi:N0+2-lo] = tau[lo:hi][::-1]
+    tau.flush()
+    return tau
+
+def scan_extrema(chunks, dtype=np.int64, out=None, reflect=False):
+    '''
+    Args:
+        chunks (iterable[numpy.ndarray]): consecutive pieces of the delta sequence
+        dtype (numpy.dtype): an optional argument to specify the dtype of the output
+        out (file): an optional binary file to write the extrema to as they are found, instead of keeping them in memory
+        reflect (bool): an optional argument to say that the chunks stop at the middle of the delta sequence,
+            so the extrema are completed as in tau_extrema_sequence.reflect_extrema; out must then also be open for reading
+
+    Returns (numpy.ndarray): the extrema sequence, with the same turning points as tau_extrema_sequence.iter_extrema,
+        or None if out is given; each chunk is scanned by tau_extrema_sequence._numpy_turns, which carries the value of tau
+        and the direction it last moved in from one chunk to the next
+    '''
+    start = out.tell() if out is not None else 0
+    pieces = []
+    value, direction = 0, -1
+
+    for values in chunks:
+        piece, value, direction = tau_extrema_sequence._numpy_turns(values[values != 0], value, direction, dtype=dtype)
+        pieces.append(piece)
+        if out is not None:
+            out.write(pieces.pop().tobytes())
+
+    if reflect:
+        pieces.append(np.array([value], dtype=dtype))
+        if out is None:
+            return np.concatenate(pieces + [piece[::-1] for piece in reversed(pieces[:-1])])
+        out.write(pieces.pop().tobytes())
+        _append_reversed(out, start, out.tell() - np.dtype(dtype).itemsize, dtype)
+        return None
+
+    # no steps are left, so this only ends the sequence with its last value if it was going down
+    pieces.append(tau_extrema_sequence._numpy_turns(np.zeros(0, dtype=np.int8), value, direction, final=True, dtype=dtype)[0])
+    if out is not None:
+        for piece in pieces:
+            out.write(piece.tobytes())
+        return None
+    return np.concatenate(pieces)
+
+def _append_reversed(f, lo, hi, dtype, chunk=DEFAULT_CHUNK):
+    # append the entries between the byte offsets lo and hi of f in reverse order, reading them back a chunk at a time
+    size = chunk*np.dtype(dtype).itemsize
+    for end in range(hi, lo, -size):
+        begin = max(lo, end - size)
+        f.seek(begin)
+        values = np.frombuffer(f.read(end - begin), dtype=dtype)
+        f.seek(0, os.SEEK_END)
+        f.write(values[::-1].tobytes())
+
+def scan_tau_minimum(chunks):
+    '''
+    Args:
+        chunks (iterable[numpy.ndarray]): consecutive pieces of the delta sequence
+
+    Returns (int): the minimum of the tau sequence, including tau[0] = 0
+    '''
+    minimum = 0
+    value = 0
+    for values in chunks:
+        if len(values) == 0:
+            continue
+        sums = np.cumsum(values, dtype=np.int64)
+        minimum = min(minimum, value + int(sums.min()))
+        value += int(sums[-1])
+    return minimum
+
+def extrema_sequence(p,q,r,delta=None,chunk=DEFAULT_CHUNK,path=None,half=True):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        delta (numpy.ndarray): an optional argument to pass in the delta sequence, e.g. the output of write_delta;
+            otherwise it is built one chunk at a time without touching the disk
+        chunk (int): an optional argument to specify how many entries of delta are held in memory at a time
+        path (str): an optional argument to write the extrema to a raw binary file as they are found, for extrema sequences
+            too long to hold in memory
+        half (bool): an optional argument to only scan delta up to its middle and reflect the extrema found
+
+    Returns (numpy.ndarray): the extrema sequence in the smallest dtype that holds it, which can be passed to
+        graded_roots.build_compact_graph or graded_roots.maximal_monotone_subroot; memory-mapped from path if it is given
+    '''
+    N0 = tau_extrema_sequence.find_naught(p,q,r)
+    dtype = tau_extrema_sequence._tau_dtype(max(N0, 0))
+    chunks = _delta_chunks(p,q,r,delta,chunk,_stop(p,q,r,half))
+    if path is None:
+        return scan_extrema(chunks, dtype, reflect=half)
+
+    with open(path, 'w+b') as out:
+        scan_extrema(chunks, dtype, out, half)
+    # a memory map cannot be empty, but every extrema sequence has at least one entry
+    return np.memmap(path, dtype=dtype, mode='r')
+
+def tau_minimum(p,q,r,delta=None,chunk=DEFAULT_CHUNK,half=True):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        delta (numpy.ndarray): an optional argument to pass in the delta sequence, e.g. the output of write_delta
+        chunk (int): an optional argument to specify how many entries of delta are held in memory at a time
+        half (bool): an optional argument to only scan delta up to its middle; tau is symmetric, so its minimum is reached before
+
+    Returns (int): the minimum of the tau sequence
+    '''
+    return scan_tau_minimum(_delta_chunks(p,q,r,delta,chunk,_stop(p,q,r,half)))
+
+def d_invariant(p,q,r,delta=None,chunk=DEFAULT_CHUNK):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        delta (numpy.ndarray): an optional argument to pass in the delta sequence, e.g. the output of write_delta
+        chunk (int): an optional argument to specify how many entries of delta are held in memory at a time
+
+    Returns (int): the d-invariant of the Brieskorn sphere, with the tau minimum found by scanning delta in chunks
+    '''
+    consts = find_d_invariant.find_constants(p,q,r)
+    dedekind_sum = find_d_invariant.dedekind(consts[1],p) + find_d_invariant.dedekind(consts[2],q) + find_d_invariant.dedekind(consts[3],r)
+    return find_d_invariant.d_from_invariants(p,q,r, dedekind_sum, tau_minimum(p,q,r,delta,chunk))
+
+def build(p,q,r,directory=None,chunk=DEFAULT_CHUNK):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        directory (str): an optional argument to specify where to write the files; defaults to a new temporary directory
+
+    Returns (tuple of 2): the memory-mapped delta and tau sequences, saved as "delta for p, q, r.npy" and "tau for p, q, r.npy",
+        which can be reopened later with numpy.load(path, mmap_mode='r')
+    '''
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='lattice-homology-')
+    name = f'{p}, {q}, {r}'
+    delta = write_delta(p,q,r,os.path.join(directory, f'delta for {name}.npy'),chunk)
+    tau = write_tau(p,q,r,os.path.join(directory, f'tau for {name}.npy'),delta,chunk)
+    return delta, tau
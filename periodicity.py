@@ -0,0 +1,178 @@
+import sys
+import math
+import random
+import argparse
+
+import family
+import graded_roots
+
+def subroot_vector(subroot):
+    '''
+    Args:
+        subroot (dict[int, int]): maximal monotone subroot, output of graded_roots.maximal_monotone_subroot
+
+    Returns (tuple[int]): the lowest and highest stem layers, the number of branches, then the layer and depth of each branch,
+        as in subroot_data.encode_subroot
+    '''
+    branches = [(layer, depth) for layer, depth in sorted(subroot.items()) if depth != layer]
+    return (min(subroot.keys()), max(subroot.keys()), len(branches)) + tuple(value for branch in branches for value in branch)
+
+def vector_subroot(vector):
+    '''
+    Args:
+        vector (tuple[int]): output of subroot_vector
+
+    Returns (dict[int, int]): the maximal monotone subroot it encodes
+    '''
+    bottom, top = vector[0], vector[1]
+    subroot = {layer: layer for layer in range(bottom, top+1)}
+    for i in range(3, len(vector), 2):
+        subroot[vector[i]] = vector[i+1]
+    return subroot
+
+class PeriodicModel:
+    '''
+    Class which represents a maximal monotone subroot that is eventually periodic in r for a fixed p, q:
+    along each residue class of r modulo the period, the lowest and highest stem layers and the layers and depths of the branches
+    all change by the same amount from one r to the next
+
+    Attributes:
+        p, q (int): the fixed parameters of the Brieskorn spheres
+        period (int): the period in r, a multiple of p*q
+        start (int): the smallest r the model was fitted from; smaller r are not predicted
+        classes (dict[int, tuple]): for each residue of r modulo the period, (r0, vector0, step), where vector0 is the subroot_vector at r0
+            and step is its change when r grows by the period
+    '''
+    def __init__(self, p, q, period, start, classes):
+        self.p = p
+        self.q = q
+        self.period = period
+        self.start = start
+        self.classes = classes
+
+    def predict_vector(self, r):
+        '''
+        Args:
+            r (int): the varying parameter of the Brieskorn sphere, at least start
+
+        Returns (tuple[int]): the subroot_vector of the predicted maximal monotone subroot of (p, q, r),
+            in time proportional to the number of branches
+        '''
+        if r < self.start:
+            raise ValueError(f'the model only predicts r >= {self.start}, got {r}')
+        if r % self.period not in self.classes:
+            raise ValueError(f'{r} is not coprime to {self.p} and {self.q}')
+        r0, vector0, step = self.classes[r % self.period]
+        t = (r - r0) // self.period
+        return tuple(value + t*change for value, change in zip(vector0, step))
+
+    def predict(self, r):
+        '''
+        Returns (dict[int, int]): the predicted maximal monotone subroot of (p, q, r), with one entry per stem layer
+        '''
+        return vector_subroot(self.predict_vector(r))
+
+def _fit(vectors):
+    # the step of an arithmetic progression of vectors of the same shape, or None if the vectors do not form one
+    if any(len(vector) != len(vectors[0]) for vector in vectors):
+        return None
+    step = tuple(b - a for a, b in zip(vectors[0], vectors[1]))
+    for previous, vector in zip(vectors[1:], vectors[2:]):
+        if tuple(b - a for a, b in zip(previous, vector)) != step:
+            return None
+    return step
+
+def detect_period(p, q, start=None, samples=3, max_multiple=4):
+    '''
+    Args:
+        p, q (int): the fixed parameters of the Brieskorn spheres
+        start (int): an optional argument to specify the smallest r to sample from; defaults to 2*p*q,
+            past the first values of r where the subroot is not periodic yet
+        samples (int): an optional argument to specify how many values of r are computed in each residue class, at least 3
+        max_multiple (int): an optional argument to specify the largest period tried, as a multiple of p*q
+
+    Returns (PeriodicModel): the model with the smallest period k*p*q, for k up to max_multiple, that fits every sample;
+        None if no period fits
+    '''
+    if samples < 3:
+        raise ValueError('at least 3 samples per residue class are needed to check a period')
+    if start is None:
+        start = 2*p*q
+
+    brieskorn = family.BrieskornFamily(p,q)
+    computed = {}
+    def vector(r):
+        if r not in computed:
+            computed[r] = subroot_vector(graded_roots.maximal_monotone_subroot(brieskorn.extrema_sequence(r)))
+        return computed[r]
+
+    for multiple in range(1, max_multiple+1):
+        period = multiple*p*q
+        classes = {}
+        for residue in range(period):
+            if math.gcd(residue, p*q) != 1:
+                continue
+            r0 = start + (residue - start) % period
+            step = _fit([vector(r0 + t*period) for t in range(samples)])
+            if step is None:
+                break
+            classes[residue] = (r0, vector(r0), step)
+        else:
+            return PeriodicModel(p, q, period, start, classes)
+
+    return None
+
+def extrapolate(p, q, rs, check=10, seed=None, model=None):
+    '''
+    Args:
+        p, q (int): the fixed parameters of the Brieskorn spheres
+        rs (iterable[int]): the values of r to predict, each at least the start of the model and coprime to p and q
+        check (int): an optional argument to specify how many of the values of r, chosen at random, are also computed directly
+        seed (int): an optional argument to seed the choice of values to check
+        model (PeriodicModel): an optional argument to pass in the output of detect_period instead of detecting it again
+
+    Returns (tuple of 2): the subroot_vector of each predicted subroot as a dict from r, which stays small even when the subroots
+        have many stem layers, and a list of (r, predicted, actual) vectors for every checked r whose direct computation disagrees
+    '''
+    if model is None:
+        model = detect_period(p,q)
+        if model is None:
+            raise ValueError(f'no period found for p, q = {p}, {q}')
+
+    predictions = {r: model.predict_vector(r) for r in rs}
+
+    brieskorn = family.BrieskornFamily(p,q)
+    mismatches = []
+    for r in random.Random(seed).sample(sorted(predictions), min(check, len(predictions))):
+        actual = subroot_vector(graded_roots.maximal_monotone_subroot(brieskorn.extrema_sequence(r)))
+        if actual != predictions[r]:
+            mismatches.append((r, predictions[r], actual))
+
+    return predictions, mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detect the period in r of the maximal monotone subroots for a fixed p, q and extrapolate them to large r.')
+    parser.add_argument('p', type=int)
+    parser.add_argument('q', type=int)
+    parser.add_argument('--r-min', type=int, help='smallest r to predict; defaults to the start of the model')
+    parser.add_argument('--r-max', type=int, required=True, help='largest r to predict')
+    parser.add_argument('--check', type=int, default=10, help='number of predictions to verify by direct computation')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    model = detect_period(args.p, args.q)
+    if model is None:
+        print(f'no period found for p, q = {args.p}, {args.q}')
+        return 1
+    print(f'period {model.period} in r, from r = {model.start}')
+
+    r_min = model.start if args.r_min is None else args.r_min
+    rs = [r for r in range(r_min, args.r_max+1) if math.gcd(r, args.p*args.q) == 1]
+    predictions, mismatches = extrapolate(args.p, args.q, rs, args.check, args.seed, model)
+    print(f'predicted {len(predictions)} subroots, checked {min(args.check, len(predictions))}, {len(mismatches)} mismatches')
+    for r, predicted, actual in mismatches:
+        print(f'r = {r}: predicted {predicted}, computed {actual}')
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
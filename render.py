@@ -0,0 +1,186 @@
+import os
+import collections
+import multiprocessing
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
+def _save(points, edges, figsize, path):
+    '''
+    Args:
+        points (list[tuple[float, float]]): positions of the vertices
+        edges (list[tuple[tuple[float, float], tuple[float, float]]]): endpoints of the edges
+        figsize (tuple[float, float]): size of the figure in inches
+        path (str): where to save the .png file
+
+    Returns (str): path; the figure is drawn with matplotlib collections on a standalone Figure,
+        so nothing is registered with pyplot and nothing needs to be closed
+    '''
+    fig = Figure(figsize=figsize)
+    ax = fig.add_subplot()
+    ax.add_collection(LineCollection(edges, colors='black', linewidths=1, zorder=1))
+    if points:
+        xs, ys = zip(*points)
+        ax.scatter(xs, ys, s=60, zorder=2)
+    ax.autoscale_view()
+    ax.set_axis_off()
+    fig.savefig(path)
+    return path
+
+def lattice_homology_window(tau_extrema, cutoff=100):
+    '''
+    Args:
+        tau_extrema (list[int]): list of local extrema of a tau sequence,
+            output of tau_extrema_sequence.extrema_sequence
+        cutoff (int): an optional argument to specify how many layers from the bottom of the lattice homology upward to include
+
+    Returns (tuple of 3): the counts of vertices on each layer in the window, the positions of the vertices and the edges between them,
+        laid out like graded_roots.draw_lattice_homology; only vertices inside the window are ever visited
+    '''
+    extrema = [int(round(value)) for value in tau_extrema]
+    top = max(extrema)+2
+    min_layer = min(extrema)
+    limit = min(min_layer + cutoff, top)
+
+    # same counts as graded_roots.build_graph, clipped to the window
+    counts = {layer: 0 for layer in range(min_layer, limit)}
+    for layer in range(max(0, min_layer), limit):
+        counts[layer] = 1
+    if 0 in counts:
+        counts[0] = 2
+    length = (len(extrema)-1)//2
+    for i in range(1, length):
+        for j in range(extrema[2*i], min(extrema[2*i-1], limit)):
+            counts[j] += 1
+
+    # same traversal as graded_roots.build_graph, skipping every layer above the window
+    pointers = {layer: 0 for layer in counts.keys()}
+    links = []
+    for i in range(len(extrema)):
+        if i == 0:
+            for j in range(extrema[0], min(top-1, limit-1)):
+                links.append((j, pointers[j], pointers[j+1]))
+        elif i % 2 == 0:
+            for j in range(extrema[i], min(extrema[i-1], limit-1)):
+                links.append((j, pointers[j], pointers[j+1]))
+        else:
+            for j in range(extrema[i-1], min(extrema[i], limit)):
+                pointers[j] += 1
+
+    def position(layer, index):
+        return (index - (counts[layer] - 1)/2, layer)
+
+    points = [position(layer, index) for layer, number in counts.items() for index in range(number)]
+    edges = [(position(j, child), position(j+1, parent)) for j, child, parent in links]
+    return counts, points, edges
+
+def render_lattice_homology(tau_extrema, cutoff=100, name=None, save_dir='.', figsize=None):
+    '''
+    Args:
+        tau_extrema (list[int]): list of local extrema of a tau sequence,
+            output of tau_extrema_sequence.extrema_sequence
+        cutoff (int): an optional argument to specify how many layers from the bottom of the lattice homology upward to draw
+        name (str): an optional argument to specify a name for the saved .png file
+        save_dir (str): an optional argument to specify a directory to save the .png file; defaults to current directory
+        figsize (tuple[float, float]): an optional argument to specify the size of the figure; defaults to the size of the window
+
+    Returns (str): the path of the saved .png file, with the same name as graded_roots.draw_lattice_homology would use
+    '''
+    counts, points, edges = lattice_homology_window(tau_extrema, cutoff)
+    if figsize is None:
+        figsize = (max(max(counts.values(), default=1), 1), max(min(len(counts), cutoff-1), 1))
+
+    if name is None:
+        path = 'lattice_homology.png'
+    else:
+        path = os.path.join(save_dir, f'lattice_homology_for_{name}.png')
+    return _save(points, edges, figsize, path)
+
+def monotone_subroot_window(monotone_subroot, cutoff):
+    '''
+    Args:
+        monotone_subroot (dict[int, int]): output of graded_roots.maximal_monotone_subroot
+        cutoff (int): how many layers from the bottom of the subroot upward to include
+
+    Returns (tuple of 2): the positions of the vertices and the edges between them, laid out like graded_roots.draw_monotone_subroot
+    '''
+    top = max(monotone_subroot.keys())
+    bottom = min(monotone_subroot.values())
+
+    points = []
+    edges = []
+    for layer, depth in monotone_subroot.items():
+        # a branch is drawn whenever the stem node it hangs off of is inside the window
+        if layer >= bottom + cutoff:
+            continue
+        points.append((0, layer))
+        if layer != top and layer + 1 < bottom + cutoff:
+            edges.append(((0, layer), (0, layer+1)))
+        for side in (-1, 1):
+            points.extend((side*(layer - i), i) for i in range(depth, layer))
+            edges.extend(((side*(layer - i), i), (side*(layer - i - 1), i+1)) for i in range(depth, layer-1))
+            if depth < layer:
+                edges.append(((0, layer), (side, layer-1)))
+
+    return points, edges
+
+def render_monotone_subroot(monotone_subroot, cutoff, name=None, save_dir='new_project', figsize=None):
+    '''
+    Args:
+        monotone_subroot (dict[int, int]): output of graded_roots.maximal_monotone_subroot
+        cutoff (int): how many layers from the bottom of the subroot upward to draw
+        name (str): an optional argument to specify a name for the saved .png file
+        save_dir (str): an optional argument to specify a directory to save the .png file
+        figsize (tuple[float, float]): an optional argument to specify the size of the figure; defaults to the size of the window
+
+    Returns (str): the path of the saved .png file, with the same name as graded_roots.draw_monotone_subroot would use
+    '''
+    points, edges = monotone_subroot_window(monotone_subroot, cutoff)
+    if figsize is None:
+        xs = [abs(x) for x, _ in points]
+        ys = [y for _, y in points]
+        figsize = (max(2*max(xs, default=0), 1), max(max(ys, default=0) - min(ys, default=0), 1))
+
+    if name is None:
+        path = 'monotone_subroot.png'
+    else:
+        path = os.path.join(save_dir, f'monotone_subroot_for_{name}.png')
+    return _save(points, edges, figsize, path)
+
+RENDERERS = {
+    'lattice_homology': render_lattice_homology,
+    'monotone_subroot': render_monotone_subroot,
+}
+
+def render_batch(items, cutoff=100, save_dir='.', kind='monotone_subroot', processes=None, max_pending=None):
+    '''
+    Args:
+        items (iterable[tuple[str, object]]): pairs of a name and the extrema sequence or monotone subroot to draw;
+            a generator that computes them lazily is consumed while earlier items are being drawn
+        cutoff (int): an optional argument to specify how many layers from the bottom upward to draw
+        save_dir (str): an optional argument to specify a directory to save the .png files
+        kind (str): an optional argument to choose between 'monotone_subroot' and 'lattice_homology'
+        processes (int): an optional argument to specify the number of rendering processes
+        max_pending (int): an optional argument to bound the number of items waiting to be drawn; defaults to twice the number of processes
+
+    Returns (list[str]): the paths of the saved .png files, in the order of items
+    '''
+    render = RENDERERS[kind]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2*processes
+
+    paths = []
+    # recycle the workers every so often so that nothing accumulates across thousands of figures
+    with multiprocessing.Pool(processes, maxtasksperchild=200) as pool:
+        pending = collections.deque()
+        for name, data in items:
+            # wait for the oldest item before handing out more work, so memory stays bounded
+            if len(pending) >= max_pending:
+                paths.append(pending.popleft().get())
+            pending.append(pool.apply_async(render, (data, cutoff, name, save_dir)))
+
+        while pending:
+            paths.append(pending.popleft().get())
+
+    return paths
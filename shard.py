@@ -0,0 +1,410 @@
+import os
+import sys
+import json
+import time
+import heapq
+import socket
+import sqlite3
+import argparse
+import itertools
+import threading
+import contextlib
+import multiprocessing
+
+import cli
+import sweep
+import tau_extrema_sequence
+
+def estimated_cost(p,q,r):
+    '''
+    Returns (int): the estimated cost of computing (p, q, r), which grows with N0 = pqr - pq - qr - rp
+    '''
+    return max(tau_extrema_sequence.find_naught(p,q,r), 1)
+
+def plan(triples, shards, unit_cost=None, batch_size=64):
+    '''
+    Args:
+        triples (iterable[tuple[int, int, int]]): the valid triples of the whole sweep, in order
+        shards (int): the number of shards to split the sweep into
+        unit_cost (int): an optional argument to specify the largest estimated cost of a unit of work;
+            defaults to a cost giving every shard about a hundred units
+        batch_size (int): an optional argument to specify the largest number of triples in a unit of work
+
+    Returns (list[tuple]): the units of work (index, shard, p, q, rs, cost), in the order of triples; each unit is a run of
+        consecutive triples with the same p, q, and units are assigned to the least loaded shard, largest first,
+        so the same arguments always give the same plan on every machine
+    '''
+    triples = [tuple(triple) for triple in triples]
+    if unit_cost is None:
+        unit_cost = max(sum(estimated_cost(*triple) for triple in triples) // (100*shards), 1)
+
+    units = []
+    for (p, q), group in itertools.groupby(triples, key=lambda triple: triple[:2]):
+        rs, cost = [], 0
+        for _, _, r in group:
+            if rs and (cost + estimated_cost(p,q,r) > unit_cost or len(rs) >= batch_size):
+                units.append((p, q, tuple(rs), cost))
+                rs, cost = [], 0
+            rs.append(r)
+            cost += estimated_cost(p,q,r)
+        if rs:
+            units.append((p, q, tuple(rs), cost))
+
+    # longest processing time first, with ties broken by position so the assignment is deterministic
+    loads = [(0, shard) for shard in range(shards)]
+    assignment = [None]*len(units)
+    for index in sorted(range(len(units)), key=lambda index: (-units[index][3], index)):
+        load, shard = heapq.heappop(loads)
+        assignment[index] = shard
+        heapq.heappush(loads, (load + units[index][3], shard))
+
+    return [(index, assignment[index]) + unit for index, unit in enumerate(units)]
+
+class WorkQueue:
+    '''
+    Class which represents the work queue and checkpoint of one shard as a single SQLite file;
+    workers lease units of work for a limited time, so the units of a crashed worker are picked up again once their lease expires,
+    until a unit has been leased max_attempts times and is marked failed, and the rows of every finished unit are committed together with marking it done
+
+    Attributes:
+        path (str): the path of the queue file
+        connection (sqlite3.Connection): the open connection to the queue
+    '''
+    def __init__(self, path):
+        self.path = path
+        # autocommit mode, so that leases can take the write lock with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "id INTEGER PRIMARY KEY, p INTEGER NOT NULL, q INTEGER NOT NULL, rs TEXT NOT NULL, cost INTEGER NOT NULL, "
+            "state TEXT NOT NULL DEFAULT 'pending', owner TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, rows TEXT)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def meta(self):
+        '''
+        Returns (dict): the command, shard, number of shards and options of the sweep this queue belongs to
+        '''
+        return {key: json.loads(value) for key, value in self.connection.execute("SELECT key, value FROM meta")}
+
+    def enqueue(self, units, meta):
+        '''
+        Args:
+            units (iterable[tuple]): units of work (index, p, q, rs, cost)
+            meta (dict): the command, shard, number of shards and options of the sweep
+
+        Returns (None): adds the units not already in the queue, so planning the same shard again resumes it;
+            raises ValueError if the queue belongs to a different sweep or was planned with different units of work
+        '''
+        existing = self.meta()
+        if existing and existing != meta:
+            raise ValueError(f'{self.path} belongs to a different sweep: {existing}')
+
+        units = [(index, p, q, tuple(rs), cost) for index, p, q, rs, cost in units]
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            planned = [(index, p, q, tuple(json.loads(rs)), cost) for index, p, q, rs, cost in self.connection.execute("SELECT id, p, q, rs, cost FROM units ORDER BY id")]
+            if planned and planned != sorted(units):
+                raise ValueError(f'{self.path} was planned with different units of work; use the same triples, shards, unit cost and batch size')
+            self.connection.executemany("INSERT OR IGNORE INTO meta VALUES (?, ?)", ((key, json.dumps(value)) for key, value in meta.items()))
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO units (id, p, q, rs, cost) VALUES (?, ?, ?, ?, ?)",
+                ((index, p, q, json.dumps(rs), cost) for index, p, q, rs, cost in units)
+            )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def lease(self, owner, lease_seconds=600, max_attempts=3):
+        '''
+        Args:
+            owner (str): the name of the worker taking the lease
+            lease_seconds (float): an optional argument to specify how long the worker has to finish the unit
+            max_attempts (int): an optional argument to specify how many leases of a unit may expire before it is marked failed,
+                so that a unit which crashes its worker every time does not keep the shard from finishing
+
+        Returns (tuple or None): a unit of work (index, p, q, rs) that is pending or whose lease has expired, now leased to owner,
+            or None if every unit is done, failed or leased
+        '''
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            # the owner is kept, so that the worker which held the last lease can still complete the unit
+            self.connection.execute(
+                "UPDATE units SET state = 'failed', lease_until = NULL WHERE state = 'leased' AND lease_until < ? AND attempts >= ?", (now, max_attempts)
+            )
+            row = self.connection.execute(
+                "SELECT id, p, q, rs FROM units WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) ORDER BY id LIMIT 1", (now,)
+            ).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE units SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (owner, now + lease_seconds, row[0])
+                )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        return row[0], row[1], row[2], tuple(json.loads(row[3]))
+
+    def renew(self, index, owner, lease_seconds=600):
+        '''
+        Args:
+            index (int): the unit of work being computed
+            owner (str): the worker holding its lease
+            lease_seconds (float): an optional argument to specify how long from now the lease lasts
+
+        Returns (bool): whether owner still held the lease, which is then extended; False if the lease already expired
+            and was taken over, or the unit is done
+        '''
+        cursor = self.connection.execute(
+            "UPDATE units SET lease_until = ? WHERE id = ? AND owner = ? AND state = 'leased'", (time.time() + lease_seconds, index, owner)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, index, owner, rows):
+        '''
+        Args:
+            index (int): the unit of work that was finished
+            owner (str): the worker that computed it
+            rows (list[dict]): its output rows, one per triple
+
+        Returns (bool): whether owner held the last lease of the unit, in which case the rows are checkpointed and the unit is marked done;
+            the rows of a worker whose lease expired and was taken over by another worker are discarded
+        '''
+        cursor = self.connection.execute(
+            "UPDATE units SET state = 'done', rows = ?, lease_until = NULL WHERE id = ? AND owner = ? AND state != 'done'", (json.dumps(rows), index, owner)
+        )
+        return cursor.rowcount == 1
+
+    def progress(self):
+        '''
+        Returns (dict[str, int]): the number of units and the estimated cost in each state, pending, leased, done and failed
+        '''
+        progress = {key: 0 for state in ('pending', 'leased', 'done', 'failed') for key in (state, state + '_cost')}
+        for state, count, cost in self.connection.execute("SELECT state, COUNT(*), SUM(cost) FROM units GROUP BY state"):
+            progress[state] = count
+            progress[state + '_cost'] = cost
+        return progress
+
+    def rows(self):
+        '''
+        Returns (generator[tuple[int, int, int, tuple[int], list[dict]]]): lazily yields (index, p, q, rs, rows) for every finished unit, in order
+        '''
+        for index, p, q, rs, rows in self.connection.execute("SELECT id, p, q, rs, rows FROM units WHERE state = 'done' ORDER BY id"):
+            yield index, p, q, tuple(json.loads(rs)), json.loads(rows)
+
+def create_shard(path, triples, command, shard, shards, unit_cost=None, batch_size=64, **options):
+    '''
+    Args:
+        path (str): the path of the queue file of this shard
+        triples (iterable[tuple[int, int, int]]): the valid triples of the whole sweep, in the same order on every machine
+        command (str): a key of cli.COMMANDS
+        shard (int): which shard to create, from 0 to shards - 1
+        shards (int): the total number of shards
+        unit_cost, batch_size (int): optional arguments passed to plan
+        options: extra keyword arguments of the command, e.g. save_dir for the grid
+
+    Returns (WorkQueue): the queue of the units assigned to this shard; creating a shard again keeps the work already done
+    '''
+    if command not in cli.COMMANDS:
+        raise ValueError(f'unknown command {command!r}, expected one of {sorted(cli.COMMANDS)}')
+    units = [(index, p, q, rs, cost) for index, assigned, p, q, rs, cost in plan(triples, shards, unit_cost, batch_size) if assigned == shard]
+
+    queue = WorkQueue(path)
+    queue.enqueue(units, {'command': command, 'shard': shard, 'shards': shards, 'options': options})
+    return queue
+
+@contextlib.contextmanager
+def heartbeat(path, index, owner, lease_seconds=600):
+    '''
+    Args:
+        path (str): the path of the queue file of a shard
+        index (int): the unit of work leased to owner
+        owner (str): the worker holding the lease
+        lease_seconds (float): an optional argument to specify the length of the lease
+
+    Returns (context manager): renews the lease from a background thread every third of lease_seconds while the block runs,
+        so a unit that takes longer than one lease is not handed to a second worker
+    '''
+    stopped = threading.Event()
+
+    def renew():
+        # a connection cannot be shared between threads, so the heartbeat has its own
+        with WorkQueue(path) as queue:
+            while not stopped.wait(lease_seconds/3):
+                if not queue.renew(index, owner, lease_seconds):
+                    return
+
+    thread = threading.Thread(target=renew, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+def work(path, owner=None, lease_seconds=600, max_attempts=3):
+    '''
+    Args:
+        path (str): the path of the queue file of a shard
+        owner (str): an optional argument to name this worker in its leases; defaults to the host name and process id
+        lease_seconds (float): an optional argument to specify how long a worker that stops renewing its lease, e.g. because it crashed,
+            keeps a unit before another worker may take it over
+        max_attempts (int): an optional argument passed to WorkQueue.lease
+
+    Returns (int): the number of units this worker finished, once no unit is left to lease
+    '''
+    if owner is None:
+        owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    with WorkQueue(path) as queue:
+        meta = queue.meta()
+        worker, _ = cli.COMMANDS[meta['command']]
+        finished = 0
+        while True:
+            unit = queue.lease(owner, lease_seconds, max_attempts)
+            if unit is None:
+                return finished
+            index, p, q, rs = unit
+            with heartbeat(path, index, owner, lease_seconds):
+                rows = worker(p, q, rs, **meta['options'])
+            if queue.complete(index, owner, rows):
+                finished += 1
+
+def run_shard(path, processes=1, lease_seconds=600, max_attempts=3):
+    '''
+    Args:
+        path (str): the path of the queue file of a shard
+        processes (int): an optional argument to specify the number of local worker processes sharing the queue
+        lease_seconds, max_attempts (float): optional arguments passed to work
+
+    Returns (dict[str, int]): the progress of the shard after every worker has stopped
+    '''
+    if processes == 1:
+        work(path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    else:
+        workers = [multiprocessing.Process(target=work, args=(path, None, lease_seconds, max_attempts)) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    with WorkQueue(path) as queue:
+        return queue.progress()
+
+def merge(paths, f, fmt='jsonl', partial=False):
+    '''
+    Args:
+        paths (list[str]): the queue files of the shards
+        f (file): the text file to write the merged rows to
+        fmt (str): an optional argument to choose the output format, one of 'jsonl', 'csv', 'tsv'
+        partial (bool): an optional argument to merge whatever is finished instead of requiring every shard to be complete
+
+    Returns (int): the number of rows written, in the order of the triples of the sweep
+    '''
+    queues = [WorkQueue(path) for path in paths]
+    try:
+        metas = [queue.meta() for queue in queues]
+        if any((meta['command'], meta['shards'], meta['options']) != (metas[0]['command'], metas[0]['shards'], metas[0]['options']) for meta in metas):
+            raise ValueError('the shards belong to different sweeps')
+        if not partial:
+            shards = sorted(meta['shard'] for meta in metas)
+            if shards != list(range(metas[0]['shards'])):
+                raise ValueError(f"expected shards 0 to {metas[0]['shards'] - 1}, got {shards}")
+            for queue in queues:
+                unfinished = {state: count for state, count in queue.progress().items() if state in ('pending', 'leased', 'failed') and count}
+                if unfinished:
+                    raise ValueError(f'{queue.path} is not finished: {unfinished}')
+
+        _, columns = cli.COMMANDS[metas[0]['command']]
+        writer = cli.RowWriter(f, ('p', 'q', 'r') + tuple(columns), fmt)
+        count = 0
+        # the units of every shard are numbered by their position in the whole sweep, so merging by index restores its order
+        for _, p, q, rs, rows in heapq.merge(*(queue.rows() for queue in queues)):
+            for r, row in zip(rs, rows):
+                writer.write(dict({'p': p, 'q': q, 'r': r}, **row))
+                count += 1
+        writer.flush()
+        return count
+    finally:
+        for queue in queues:
+            queue.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Split a sweep into shards with resumable work queues, run them, and merge their outputs.')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    create = subparsers.add_parser('create', help='create or resume the queue of one shard')
+    create.add_argument('command', choices=sorted(cli.COMMANDS))
+    create.add_argument('queue', help='path of the queue file of this shard')
+    create.add_argument('--shard', type=int, required=True)
+    create.add_argument('--shards', type=int, required=True)
+    create.add_argument('--p')
+    create.add_argument('--q')
+    create.add_argument('--r')
+    create.add_argument('--file', help='file with one triple per line')
+    create.add_argument('--unit-cost', type=int, help='largest estimated cost of a unit of work')
+    create.add_argument('--batch-size', type=int, default=64)
+    create.add_argument('--save-dir', default='.', help='directory to save the spreadsheets in, for the grid command')
+
+    run = subparsers.add_parser('run', help='work on a shard until its queue is empty')
+    run.add_argument('queue')
+    run.add_argument('--processes', type=int, default=1)
+    run.add_argument('--lease-seconds', type=float, default=600)
+    run.add_argument('--max-attempts', type=int, default=3, help='number of expired leases after which a unit is marked failed')
+
+    status = subparsers.add_parser('status', help='print the progress of shards')
+    status.add_argument('queues', nargs='+')
+
+    combine = subparsers.add_parser('merge', help='merge the outputs of every shard')
+    combine.add_argument('queues', nargs='+')
+    combine.add_argument('--output', default='-')
+    combine.add_argument('--format', choices=('jsonl', 'csv', 'tsv'), default='jsonl')
+    combine.add_argument('--partial', action='store_true', help='merge the finished units even if some shards are not done')
+
+    args = parser.parse_args(argv)
+
+    if args.action == 'create':
+        if args.file is not None:
+            triples = sweep.valid_triples(sweep.read_triples(args.file))
+        elif args.p is not None and args.q is not None and args.r is not None:
+            triples = sweep.brieskorn_triples(cli.parse_range(args.p)(), cli.parse_range(args.q, ('p',)), cli.parse_range(args.r, ('p', 'q')))
+        else:
+            parser.error('give either --file or all of --p, --q and --r')
+        options = {'save_dir': args.save_dir} if args.command == 'grid' else {}
+        with create_shard(args.queue, triples, args.command, args.shard, args.shards, args.unit_cost, args.batch_size, **options) as queue:
+            print(json.dumps(queue.progress()))
+
+    elif args.action == 'run':
+        print(json.dumps(run_shard(args.queue, args.processes, args.lease_seconds, args.max_attempts)))
+
+    elif args.action == 'status':
+        for path in args.queues:
+            with WorkQueue(path) as queue:
+                print(path, json.dumps(queue.progress()))
+
+    else:
+        f = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+        try:
+            merge(args.queues, f, args.format, args.partial)
+        finally:
+            if f is not sys.stdout:
+                f.close()
+
+if __name__ == '__main__':
+    main()
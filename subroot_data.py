@@ -1,41 +1,253 @@
-import math
+import os
 import pickle
-from os.path import exists
+import sqlite3
+from array import array
 
 import graded_roots
+import sweep
 import tau_extrema_sequence
 
-def generate_data(p_max, q_max):
-    for p in range(2, p_max+1):
-        for q in range(3, q_max+1):
-            if math.gcd(p,q) == 1:
-                for r in range(2, 2*p*q+2):
-                    if math.gcd(p,r) == 1 and math.gcd(q,r) == 1:
-                        if set([p,q,r]) == set([2,3,5]):
-                            break
-                        save_path = f"maximal_monotone_subroot_data/{p}, {q}, {r}.pickle"
-                        if not exists(save_path):
-                            with open(save_path, "wb") as f: 
-                                pickle.dump(graded_roots.maximal_monotone_subroot(tau_extrema_sequence.extrema_sequence(p,q,r)), f)
-
-def read_data(p,q,r):
-    with open(f"maximal_monotone_subroot_data/{p}, {q}, {r}.pickle", "rb") as f:
-        subroot = pickle.load(f)
-        pop_keys = []
-        min_stem = 1000000
-        for key in subroot:
-            if subroot[key] == key:
-                pop_keys.append(key)
-                if key < min_stem:
-                    min_stem = key
-
-        for key in pop_keys:
-            subroot.pop(key)
-        
+DEFAULT_PATH = "maximal_monotone_subroot_data.sqlite"
+
+def encode_subroot(subroot):
+    '''
+    Args:
+        subroot (dict[int, int]): maximal monotone subroot, output of graded_roots.maximal_monotone_subroot
+
+    Returns (tuple of 3): the lowest and highest stem layers, and the bytes of the flattened (layer, depth) pairs
+        for only the layers that actually have a branch, as 64-bit integers since the gradings of large triples overflow 32 bits
+    '''
+    branches = array('q')
+    for layer, depth in subroot.items():
+        if depth != layer:
+            branches.append(layer)
+            branches.append(depth)
+    return min(subroot.keys()), max(subroot.keys()), branches.tobytes()
+
+def decode_subroot(bottom, top, blob):
+    '''
+    Args:
+        bottom, top (int): the lowest and highest stem layers
+        blob (bytes): the flattened (layer, depth) pairs of the branching layers, output of encode_subroot
+
+    Returns (dict[int, int]): the maximal monotone subroot, in the format of the output of graded_roots.maximal_monotone_subroot
+    '''
+    branches = array('q')
+    branches.frombytes(blob)
+    subroot = {layer: layer for layer in range(bottom, top+1)}
+    for i in range(0, len(branches), 2):
+        subroot[branches[i]] = branches[i+1]
+    return subroot
+
+class SubrootStore:
+    '''
+    Class which represents a single-file SQLite store of maximal monotone subroots, indexed by (p, q, r)
+
+    Attributes:
+        path (str): the path of the database file
+        connection (sqlite3.Connection): the open connection to the database
+    '''
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS subroots ("
+            "p INTEGER NOT NULL, q INTEGER NOT NULL, r INTEGER NOT NULL, "
+            "bottom INTEGER NOT NULL, top INTEGER NOT NULL, branches BLOB NOT NULL, "
+            "PRIMARY KEY (p, q, r)) WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM subroots").fetchone()[0]
+
+    def __contains__(self, triple):
+        return self.connection.execute("SELECT 1 FROM subroots WHERE p = ? AND q = ? AND r = ?", tuple(triple)).fetchone() is not None
+
+    def put_many(self, items):
+        '''
+        Args:
+            items (iterable[tuple[tuple[int, int, int], dict[int, int]]]): pairs of a triple and its maximal monotone subroot,
+                all inserted in a single transaction
+        '''
+        rows = ((p, q, r) + encode_subroot(subroot) for (p, q, r), subroot in items)
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO subroots VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def put(self, triple, subroot):
+        self.put_many([(triple, subroot)])
+
+    def get(self, p, q, r):
+        '''
+        Returns (dict[int, int]): the stored maximal monotone subroot of (p, q, r); raises KeyError if it is not stored
+        '''
+        row = self.connection.execute("SELECT bottom, top, branches FROM subroots WHERE p = ? AND q = ? AND r = ?", (p, q, r)).fetchone()
+        if row is None:
+            raise KeyError((p, q, r))
+        return decode_subroot(*row)
+
+    def triples(self):
+        '''
+        Returns (list[tuple[int, int, int]]): every stored triple, in sorted order
+        '''
+        return [tuple(row) for row in self.connection.execute("SELECT p, q, r FROM subroots ORDER BY p, q, r")]
+
+    def items(self):
+        '''
+        Returns (generator[tuple[tuple[int, int, int], dict[int, int]]]): lazily yields every stored triple with its subroot, in sorted order
+        '''
+        for p, q, r, bottom, top, blob in self.connection.execute("SELECT * FROM subroots ORDER BY p, q, r"):
+            yield (p, q, r), decode_subroot(bottom, top, blob)
+
+    def missing(self, triples):
+        '''
+        Args:
+            triples (iterable[tuple[int, int, int]]): candidate triples
+
+        Returns (list[tuple[int, int, int]]): the candidate triples that are not stored yet, in their original order,
+            found with a single query instead of one lookup per triple
+        '''
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS candidates (position INTEGER PRIMARY KEY, p INTEGER, q INTEGER, r INTEGER)")
+            self.connection.execute("DELETE FROM candidates")
+            self.connection.executemany("INSERT INTO candidates (p, q, r) VALUES (?, ?, ?)", (tuple(triple) for triple in triples))
+            rows = self.connection.execute(
+                "SELECT c.p, c.q, c.r FROM candidates c "
+                "LEFT JOIN subroots s ON s.p = c.p AND s.q = c.q AND s.r = c.r "
+                "WHERE s.p IS NULL ORDER BY c.position"
+            ).fetchall()
+            self.connection.execute("DELETE FROM candidates")
+        return [tuple(row) for row in rows]
+
+class SubrootIndex:
+    '''
+    Class which groups triples into equivalence classes of their maximal monotone subroots, in the sense of
+    graded_roots.check_monotone_equivalence, by hashing fingerprints instead of comparing pairs
+
+    Attributes:
+        classes (dict[str, list[tuple[int, int, int]]]): from the hash of each fingerprint to the triples with that fingerprint
+        fingerprints (dict[str, tuple]): from the hash of each fingerprint to the fingerprint itself
+    '''
+    def __init__(self, items=()):
+        self.classes = {}
+        self.fingerprints = {}
+        self.add_many(items)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def add(self, triple, subroot):
+        '''
+        Returns (str): the hash of the fingerprint of subroot, after recording triple under it
+        '''
+        fingerprint = graded_roots.monotone_fingerprint(subroot)
+        key = graded_roots.monotone_hash(subroot)
+        # the hash is 128 bits, but check the fingerprint anyway so that a collision can never merge two classes silently
+        if self.fingerprints.setdefault(key, fingerprint) != fingerprint:
+            raise ValueError(f"hash collision between fingerprints {self.fingerprints[key]} and {fingerprint}")
+        self.classes.setdefault(key, []).append(tuple(triple))
+        return key
+
+    def add_many(self, items):
+        '''
+        Args:
+            items (iterable[tuple[tuple[int, int, int], dict[int, int]]]): pairs of a triple and its maximal monotone subroot,
+                e.g. the output of SubrootStore.items or of a sweep
+        '''
+        for triple, subroot in items:
+            self.add(triple, subroot)
+
+    def equivalent_to(self, subroot):
+        '''
+        Returns (list[tuple[int, int, int]]): the indexed triples whose subroot is equivalent to subroot
+        '''
+        return list(self.classes.get(graded_roots.monotone_hash(subroot), []))
+
+    def groups(self):
+        '''
+        Returns (list[list[tuple[int, int, int]]]): the equivalence classes of the indexed triples, largest first
+        '''
+        return sorted(self.classes.values(), key=len, reverse=True)
+
+def monotone_subroot(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (dict[int, int]): the maximal monotone subroot of the Brieskorn sphere
+    '''
+    return graded_roots.maximal_monotone_subroot(tau_extrema_sequence.extrema_sequence(p,q,r))
+
+def generate_data(p_max, q_max, path=DEFAULT_PATH, processes=None, batch_size=1000):
+    '''
+    Args:
+        p_max, q_max (int): the largest values of p and q to generate data for; r runs up to 2*p*q+1
+        path (str): an optional argument to specify the path of the store
+        processes (int): an optional argument to specify the number of worker processes
+        batch_size (int): an optional argument to specify how many subroots are inserted per transaction
+
+    Returns (None): nothing is returned; it computes and stores the subroots of every triple missing from the store
+    '''
+    triples = sweep.brieskorn_triples(range(2, p_max+1), range(3, q_max+1), lambda p, q: range(2, 2*p*q+2))
+
+    with SubrootStore(path) as store:
+        todo = store.missing(triples)
+        batch = []
+        for triple, subroot in sweep.sweep(monotone_subroot, todo, processes=processes, ordered=False):
+            batch.append((triple, subroot))
+            if len(batch) >= batch_size:
+                store.put_many(batch)
+                batch = []
+        store.put_many(batch)
+
+def read_data(p,q,r,path=DEFAULT_PATH):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        path (str): an optional argument to specify the path of the store
+
+    Returns (dict[int, int]): the stored maximal monotone subroot with the trivial stem layers removed,
+        except for the lowest one; raises KeyError if it is not stored
+    '''
+    with SubrootStore(path) as store:
+        subroot = store.get(p,q,r)
+
+    # the layers without a branch only encode the grading shift, so keep just the lowest of them, if there is one
+    min_stem = min((key for key, value in subroot.items() if key == value), default=None)
+    subroot = {key: value for key, value in subroot.items() if key != value}
+    if min_stem is not None:
         subroot[min_stem] = min_stem
-                
-        return subroot
+
+    return subroot
+
+def import_pickles(directory="maximal_monotone_subroot_data", path=DEFAULT_PATH):
+    '''
+    Args:
+        directory (str): an optional argument to specify the directory of "p, q, r.pickle" files written by earlier versions
+        path (str): an optional argument to specify the path of the store
+
+    Returns (int): the number of subroots imported into the store
+    '''
+    items = []
+    for filename in os.listdir(directory):
+        if filename.endswith(".pickle"):
+            p, q, r = (int(part) for part in filename[:-len(".pickle")].split(", "))
+            with open(os.path.join(directory, filename), "rb") as f:
+                items.append(((p, q, r), pickle.load(f)))
+
+    with SubrootStore(path) as store:
+        store.put_many(items)
+    return len(items)
 
 if __name__ == "__main__":
     generate_data(20,30)
-    # print(read_data(5,19,183))
\ No newline at end of file
+    # print(read_data(5,19,183))
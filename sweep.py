@@ -0,0 +1,112 @@
+import sys
+import math
+import multiprocessing
+
+import instrument
+
+def is_valid_triple(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (bool): whether p, q, r are pairwise coprime and are not the parameters 2, 3, 5 of the Poincare sphere,
+        which every sweep skips
+    '''
+    if math.gcd(p,q) != 1 or math.gcd(q,r) != 1 or math.gcd(r,p) != 1:
+        return False
+    return set([p,q,r]) != set([2,3,5])
+
+def valid_triples(triples):
+    '''
+    Args:
+        triples (iterable[tuple[int]]): candidate triples, e.g. the output of read_triples
+
+    Returns (generator[tuple[int, int, int]]): lazily yields the candidates that are valid triples, in order,
+        reporting every skipped candidate on standard error
+    '''
+    for triple in triples:
+        if len(triple) == 3 and is_valid_triple(*triple):
+            yield triple
+        else:
+            print(f'skipping invalid triple {triple}', file=sys.stderr)
+
+def brieskorn_triples(p_range, q_range, r_range):
+    '''
+    Args:
+        p_range (iterable[int]): values of p to sweep over
+        q_range (iterable[int] or callable): values of q to sweep over, or a function of p returning them
+        r_range (iterable[int] or callable): values of r to sweep over, or a function of p and q returning them
+
+    Returns (generator[tuple[int, int, int]]): lazily yields the valid triples (p, q, r) in the given ranges, in order
+    '''
+    for p in p_range:
+        for q in (q_range(p) if callable(q_range) else q_range):
+            if math.gcd(p,q) != 1:
+                continue
+            for r in (r_range(p,q) if callable(r_range) else r_range):
+                if is_valid_triple(p,q,r):
+                    yield (p,q,r)
+
+def read_triples(path):
+    '''
+    Args:
+        path (str): path of a file with one triple per line, written as "p, q, r" or "p q r", or - to read standard input
+
+    Returns (generator[tuple[int, int, int]]): lazily yields the triples in the file, skipping blank lines and lines starting with #
+    '''
+    f = sys.stdin if path == '-' else open(path)
+    try:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield tuple(int(part) for part in line.replace(',', ' ').split())
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def _evaluate(task):
+    func, triple = task
+    result = func(*triple)
+    # the parent cannot see what is recorded in a worker, so the counters since the last task go back with the result
+    return triple, result, instrument.drain()
+
+def sweep(func, triples, processes=None, chunksize=8, ordered=True, stop_when=None):
+    '''
+    Args:
+        func (callable): a picklable top-level function of p, q, r to evaluate on each triple
+        triples (iterable[tuple[int, int, int]]): the triples to evaluate func on, e.g. the output of brieskorn_triples
+        processes (int): an optional argument to specify the number of worker processes; defaults to the number of cores,
+            and 1 runs everything in the current process
+        chunksize (int): an optional argument to specify how many triples are sent to a worker at a time
+        ordered (bool): an optional argument to specify whether results come back in the order of triples,
+            or as soon as they are done
+        stop_when (callable): an optional function of the triple and its result; once it returns True,
+            the sweep stops after yielding that result and all of the workers are terminated
+
+    Returns (generator[tuple[tuple[int, int, int], object]]): lazily yields the pairs (triple, func(*triple));
+        while instrumentation is enabled, the counters recorded in the workers are merged into those of this process
+    '''
+    if processes == 1:
+        for triple in triples:
+            result = func(*triple)
+            yield triple, result
+            if stop_when is not None and stop_when(triple, result):
+                return
+        return
+
+    tasks = ((func, triple) for triple in triples)
+
+    # leaving the with block terminates the pool, so stopping early (or the caller abandoning the generator) stops every worker
+    # forked workers start with a copy of the counters of this process, which must not be sent back a second time
+    with multiprocessing.Pool(processes, initializer=instrument.reset) as pool:
+        if ordered:
+            results = pool.imap(_evaluate, tasks, chunksize)
+        else:
+            results = pool.imap_unordered(_evaluate, tasks, chunksize)
+
+        for triple, result, recorded in results:
+            if recorded is not None:
+                instrument.merge(*recorded)
+            yield triple, result
+            if stop_when is not None and stop_when(triple, result):
+                return
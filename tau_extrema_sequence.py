@@ -1,3 +1,15 @@
+import bisect
+import heapq
+import itertools
+
+import instrument
+
+# numpy is only needed for the optional vectorized backend, so it is imported the first time that backend is used
+np = None
+
+# the number of entries copied at a time when a half-computed list is mirrored in place
+_BLOCK = 1 << 16
+
 def find_naught(p,q,r):
     '''
     Args: 
@@ -7,102 +19,639 @@ def find_naught(p,q,r):
     '''
     return p*q*r - p*q - q*r - r*p
 
-def needed_semigroup(p,q,r):
+def find_middle(p,q,r):
     '''
-    Args: 
+    Args:
         p, q, r (int): parameters of the Brieskorn sphere
 
-    Returns (list[int]): sorted list of integers in semigroup minimally generated by p*q, q*r, and r*p up to N_0 = p*q*r - p*q - q*r - r*p
+    Returns (int): the number of indices of the delta sequence strictly before its center N_0/2; no n has both n and N_0 - n
+        in the semigroup, so delta(N_0 - n) = -delta(n) and these indices determine the whole delta sequence
+    '''
+    return max((find_naught(p,q,r) + 1)//2, 0)
+
+def progression_bases(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (list[int]): the values i*q*r + j*p*r below N_0; the semigroup up to N_0 is the union of the arithmetic progressions
+        with difference p*q starting at these values
     '''
     N0 = find_naught(p,q,r)
-    semigroup = []
+    bases = []
     for i in range(p-1):
+        if i*q*r >= N0:
+            break
         for j in range(q-1):
-            for k in range(r-1):
-                if (i*q*r + j*p*r + k*p*q < N0): # maybe could be wasting some time here
-                    # adding in nonnegative integer linear combinations of generators
-                    semigroup.append(i*q*r + j*p*r + k*p*q)
-    semigroup.sort()
+            base = i*q*r + j*p*r
+            if base >= N0:
+                break
+            bases.append(base)
+
+    return bases
 
+def needed_semigroup(p,q,r):
+    '''
+    Args: 
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (list[int]): sorted list of integers in semigroup minimally generated by p*q, q*r, and r*p up to N_0 = p*q*r - p*q - q*r - r*p
+    '''
+    with instrument.stage('needed_semigroup', p=p, q=q, r=r, N0=find_naught(p,q,r)) as span:
+        semigroup = list(iter_semigroup(p,q,r))
+        span['semigroup'] = len(semigroup)
     return semigroup
 
-def compute_delta(p,q,r): # should probably test if the direct formula given is faster than numerical semigroup
+def compute_delta(p,q,r,backend='python',as_array=False,half=False): # should probably test if the direct formula given is faster than numerical semigroup
     '''
     Args:
         p, q, r (int): parameters of the Brieskorn sphere
+        backend (str): an optional argument to choose between the 'python' and the vectorized 'numpy' implementation
+        as_array (bool): an optional argument to return a numpy array instead of a list; implies the numpy backend
+        half (bool): an optional argument to only compute the indices before find_middle and fill in the rest by delta(N0 - n) = -delta(n)
 
     Returns (list[int]): the delta sequence associated with this Brieskorn sphere
     '''
-    semigroup = needed_semigroup(p,q,r)
     N0 = find_naught(p,q,r)
+    with instrument.stage('compute_delta', p=p, q=q, r=r, N0=N0):
+        if _use_numpy(backend, as_array):
+            if half:
+                delta = _numpy_delta(p,q,r,find_middle(p,q,r),reflect=True)
+            else:
+                delta = _numpy_delta(p,q,r)
+            return delta if as_array else delta.tolist()
+
+        if half:
+            middle = find_middle(p,q,r)
+            pq = p*q
+            delta = [0]*max(N0+1, 0)
+            for base in progression_bases(p,q,r):
+                # the same scatter along each arithmetic progression as _numpy_delta, restricted to the indices below the middle
+                ups = range(base, min(N0, middle), pq)
+                delta[base:min(N0, middle):pq] = [1]*len(ups)
+                top = N0 - base
+                if top >= middle:
+                    top = middle - 1 - (middle - 1 - top) % pq
+                if top > 0:
+                    delta[top:0:-pq] = [-1]*len(range(top, 0, -pq))
+            # the center N0/2 is only an index when N0 is even, and then delta is 0 there;
+            # the mirrored indices are filled a block at a time so that only one block is ever copied
+            for lo in range(0, middle, _BLOCK):
+                hi = min(lo + _BLOCK, middle)
+                delta[N0+1-hi:N0+1-lo] = [-step for step in reversed(delta[lo:hi])]
+            return delta
 
-    # the delta sequence has value 1 at elements in the semigroup, -1 at elements that are N0 minus an element in the semigroup, and 0 otherwise
-    delta = [0]*(N0+1)
-    for num in semigroup:
-        delta[num] = 1
-        delta[N0 - num] = -1
+        semigroup = needed_semigroup(p,q,r)
+
+        # the delta sequence has value 1 at elements in the semigroup, -1 at elements that are N0 minus an element in the semigroup, and 0 otherwise
+        delta = [0]*(N0+1)
+        for num in semigroup:
+            delta[num] = 1
+            delta[N0 - num] = -1
 
     return delta
 
-def compute_tau(p,q,r):
+def iter_semigroup(p,q,r,reverse=False):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        reverse (bool): an optional argument to yield the elements in decreasing order instead
+
+    Returns (generator[int]): lazily yields the integers in the semigroup minimally generated by p*q, q*r, and r*p up to N_0 in sorted order,
+        without materializing the semigroup
+    '''
+    N0 = find_naught(p,q,r)
+    pq = p*q
+
+    # the progressions with difference p*q have distinct residues mod p*q, so we merge them by walking through blocks of length p*q
+    # and listing the residues of the progressions that have started, in order
+    starts = {}
+    for base in progression_bases(p,q,r):
+        starts.setdefault(base // pq, []).append(base % pq)
+
+    last_block = (N0 - 1) // pq
+
+    if not reverse:
+        active = []
+        for block in range(last_block + 1):
+            for residue in starts.get(block, ()):
+                bisect.insort(active, residue)
+            offset = block * pq
+            # only the last block can run past N0
+            limit = bisect.bisect_left(active, N0 - offset) if block == last_block else len(active)
+            yield from [offset + residue for residue in active[:limit]]
+    else:
+        active = sorted(residue for residues in starts.values() for residue in residues)
+        for block in range(last_block, -1, -1):
+            offset = block * pq
+            limit = bisect.bisect_left(active, N0 - offset) if block == last_block else len(active)
+            yield from [offset + residue for residue in reversed(active[:limit])]
+            # progressions that start in this block have no elements in earlier blocks
+            for residue in starts.get(block, ()):
+                del active[bisect.bisect_left(active, residue)]
+
+def iter_delta_changes(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (iterator[tuple[int, int]]): lazily yields the pairs (n, delta(n)) for every n where the delta sequence is nonzero, in increasing order of n
+    '''
+    N0 = find_naught(p,q,r)
+
+    # merge the semigroup elements (where delta is 1) with their reflections N0 minus an element in the semigroup (where delta is -1)
+    ups = ((num, 1) for num in iter_semigroup(p,q,r))
+    downs = ((N0 - num, -1) for num in iter_semigroup(p,q,r,reverse=True))
+    return heapq.merge(ups, downs)
+
+def iter_half_delta_changes(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (iterator[tuple[int, int]]): lazily yields the pairs of iter_delta_changes with n before find_middle(p,q,r),
+        which only walks through the semigroup elements below the middle and above N_0 minus the middle
+    '''
+    middle = find_middle(p,q,r)
+    return itertools.takewhile(lambda change: change[0] < middle, iter_delta_changes(p,q,r))
+
+def reflect_extrema(first, center):
+    '''
+    Args:
+        first (list[int]): the local extrema of the compressed tau sequence found before the middle of the delta sequence,
+            without the final value that iter_extrema adds when the sequence ends going down
+        center (int): the value of tau at the middle, tau[find_middle(p,q,r)]
+
+    Returns (list[int]): the whole extrema sequence; tau[N0 + 1 - n] = tau[n], so the steps of the compressed tau sequence after the middle
+        are those before it reversed and negated, the center is always a turning point and the extrema after it mirror the ones before;
+        first is extended in place
+    '''
+    first.append(center)
+    _extend_reversed(first, len(first) - 1)
+    return first
+
+def _extend_reversed(seq, stop):
+    '''
+    Args:
+        seq (list): the list to extend in place
+        stop (int): the number of leading entries of seq to mirror
+
+    Returns (None): appends seq[stop-1], ..., seq[0] to seq, copying one block of _BLOCK entries at a time
+        so that the reflection never holds a second copy of the sequence
+    '''
+    for hi in range(stop, 0, -_BLOCK):
+        seq.extend(reversed(seq[max(hi - _BLOCK, 0):hi]))
+
+def iter_tau(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (generator[int]): lazily yields the tau sequence associated with this Brieskorn sphere
+    '''
+    N0 = find_naught(p,q,r)
+    value = 0
+    index = 0
+
+    # tau is constant between consecutive nonzero values of delta, and tau[n+1] = tau[n] + delta[n]
+    for num, step in iter_delta_changes(p,q,r):
+        yield from itertools.repeat(value, num + 1 - index)
+        index = num + 1
+        value += step
+    # tau always starts with tau[0] = 0, even for degenerate parameters where N0 is negative
+    yield from itertools.repeat(value, max(N0 + 2, 1) - index)
+
+def iter_compressed_tau(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (generator[int]): lazily yields the compressed tau sequence, which is the tau sequence with consecutive duplicates removed
+    '''
+    value = 0
+    yield value
+
+    # every nonzero value of delta changes tau by exactly one, so each one contributes a new entry
+    for _, step in iter_delta_changes(p,q,r):
+        value += step
+        yield value
+
+def iter_extrema(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (generator[int]): lazily yields the extrema sequence, the list of local extrema in the compressed tau sequence,
+        using memory proportional only to the number of generators rather than N_0
+    '''
+    changes = iter_delta_changes(p,q,r)
+    value, direction = 0, -1
+
+    # scan the changes a block at a time, carrying the value and direction of tau from one block to the next
+    for first in changes:
+        extrema, value, direction = _turns(itertools.chain((first,), itertools.islice(changes, _BLOCK - 1)), value, direction)
+        yield from extrema
+
+    # no changes are left, so this only ends the sequence with its last value if it was going down
+    yield from _turns((), value, direction, final=True)[0]
+
+def _turns(changes, value=0, direction=-1, final=False):
+    '''
+    Args:
+        changes (iterable[tuple[int, int]]): consecutive pairs (n, delta(n)) of iter_delta_changes, whose values are the steps
+            of the compressed tau sequence
+        value (int): an optional argument to give the value of tau before the first step
+        direction (int): an optional argument to give the step before the first one; the defaults start out "decreasing" at tau[0] = 0,
+            so that the initial 0 counts as an extremum exactly when the sequence first goes up
+        final (bool): an optional argument to say that these are the last steps, after which the sequence ends with an extremum
+            if it was going down
+
+    Returns (tuple of 3): the local extrema of the compressed tau sequence among these steps, and the value and direction
+        after the last step, to continue the scan with the steps that follow
+    '''
+    extrema = []
+    for _, step in changes:
+        if step != direction:
+            # the compressed tau sequence changes direction, so the value before this step is a local extremum
+            extrema.append(value)
+            direction = step
+        value += step
+
+    if final and direction == -1:
+        extrema.append(value)
+    return extrema, value, direction
+
+def compute_tau(p,q,r,backend='python',as_array=False,half=False):
     '''
     Args: 
         p, q, r (int): parameters of the Brieskorn sphere
+        backend (str): an optional argument to choose between the 'python' and the vectorized 'numpy' implementation
+        as_array (bool): an optional argument to return a numpy array instead of a list; implies the numpy backend
+        half (bool): an optional argument to only sum delta up to find_middle and fill in the rest by tau[N0 + 1 - n] = tau[n]
 
     Returns (list[int]): the tau sequence associated with this Brieskorn sphere
     '''
-    tau = []
-    tau.append(0)
     N0 = find_naught(p,q,r)
-    deltas = compute_delta(p,q,r)
+    length = max(N0 + 2, 1)
+    with instrument.stage('compute_tau', p=p, q=q, r=r, N0=N0):
+        if _use_numpy(backend, as_array):
+            if half:
+                middle = find_middle(p,q,r)
+                tau = np.zeros(length, dtype=_tau_dtype(max(N0+1, 0) - 1))
+                np.cumsum(_numpy_delta(p,q,r,middle), dtype=tau.dtype, out=tau[1:middle+1])
+                if length > middle + 1:
+                    tau[middle+1:] = tau[N0-middle::-1]
+            else:
+                tau = _numpy_tau(_numpy_delta(p,q,r))
+            return tau if as_array else tau.tolist()
+
+        if half:
+            tau = []
+            value = 0
+            for num, step in iter_half_delta_changes(p,q,r):
+                tau.extend(itertools.repeat(value, num + 1 - len(tau)))
+                value += step
+            tau.extend(itertools.repeat(value, find_middle(p,q,r) + 1 - len(tau)))
+            # tau[N0 + 1 - n] = tau[n] for the indices after the middle
+            _extend_reversed(tau, length - len(tau))
+            return tau
+
+        # the tau sequences is given as the partial summations of the delta sequence;
+        # this is the same walk as iter_tau, but extending a list in runs avoids the per-element generator overhead
+        tau = []
+        value = 0
+        for num, step in iter_delta_changes(p,q,r):
+            tau.extend(itertools.repeat(value, num + 1 - len(tau)))
+            value += step
+        tau.extend(itertools.repeat(value, max(N0 + 2, 1) - len(tau)))
 
-    # the tau sequences is given as the partial summations of the delta sequence:
-    for i in range(1, N0+2):
-        tau.append(tau[-1] + deltas[i-1])
-    
     return tau
 
-def compress_tau(p,q,r):
+def compress_tau(p,q,r,backend='python',as_array=False,half=False):
     '''
     Args:
         p, q, r (int): parmaeters of the Brieskorn sphere
+        backend (str): an optional argument to choose between the 'python' and the vectorized 'numpy' implementation
+        as_array (bool): an optional argument to return a numpy array instead of a list; implies the numpy backend
+        half (bool): an optional argument to only compress tau up to the middle of delta; the compressed tau sequence is a palindrome
 
     Returns (list[int]): returns the compressed tau sequence, which is the tau sequence with consecutive duplicates removed
     '''
-    tau = compute_tau(p,q,r)
-    compress = []
-    compress.append(0)
-    N0 = find_naught(p,q,r)
+    with instrument.stage('compress_tau', p=p, q=q, r=r, N0=find_naught(p,q,r)) as span:
+        if _use_numpy(backend, as_array):
+            if half:
+                compress = _numpy_compress(_numpy_delta(p,q,r,find_middle(p,q,r)), find_naught(p,q,r), reflect=True)
+            else:
+                compress = _numpy_compress(_numpy_delta(p,q,r))
+            if not as_array:
+                compress = compress.tolist()
+        elif half:
+            compress = [0]
+            for _, step in iter_half_delta_changes(p,q,r):
+                compress.append(compress[-1] + step)
+            _extend_reversed(compress, len(compress) - 1)
+        else:
+            compress = list(iter_compressed_tau(p,q,r))
+        span['compressed'] = len(compress)
 
-    for i in range(N0+2):
-        # check if the number we just added to the compressed tau sequence equals the next number in the tau sequence; if not, add the next number
-        if compress[-1] != tau[i]:
-            compress.append(tau[i])
     return compress
 
-def extrema_sequence(p,q,r):
+def extrema_sequence(p,q,r,backend='python',as_array=False,half=False):
     '''
     Args:
         p, q, r (int): parameters of the Brieskorn sphere
+        backend (str): an optional argument to choose between the 'python' and the vectorized 'numpy' implementation
+        as_array (bool): an optional argument to return a numpy array instead of a list; implies the numpy backend
+        half (bool): an optional argument to only walk delta up to find_middle and complete the extrema with reflect_extrema,
+            which halves the time and the memory used besides the output
 
     Returns (list[int]): returns the extrema sequence, the list of local extrema in the compressed tau sequence
     '''
+    with instrument.stage('extrema_sequence', p=p, q=q, r=r, N0=find_naught(p,q,r)) as span:
+        if _use_numpy(backend, as_array):
+            if half:
+                first, center = _numpy_half_extrema(_numpy_delta(p,q,r,find_middle(p,q,r)), find_naught(p,q,r))
+                extrema = np.empty(2*len(first) + 1, dtype=first.dtype)
+                extrema[:len(first)] = first
+                extrema[len(first)] = center
+                extrema[len(first)+1:] = first[::-1]
+            else:
+                extrema = _numpy_extrema(_numpy_delta(p,q,r))
+            if not as_array:
+                extrema = extrema.tolist()
+        elif half:
+            extrema = reflect_extrema(*_half_extrema(p,q,r))
+        else:
+            extrema = list(iter_extrema(p,q,r))
+        span['extrema'] = len(extrema)
+
+    return extrema
+
+def _half_extrema(p,q,r):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+
+    Returns (tuple of 2): the extrema found by iter_extrema before the middle of the delta sequence, and the value of tau at the middle,
+        the input of reflect_extrema
+    '''
+    first, value, _ = _turns(iter_half_delta_changes(p,q,r))
+    return first, value
+
+def _floor_sum(n, m, a, b):
+    # the sum of (a*i + b)//m for i in range(n), for nonnegative a and b, in O(log m) steps like the Euclidean algorithm
+    total = 0
+    while True:
+        if a >= m:
+            total += (n-1)*n//2 * (a//m)
+            a %= m
+        if b >= m:
+            total += n * (b//m)
+            b %= m
+        y_max = a*n + b
+        if y_max < m:
+            return total
+        n, b, m, a = y_max // m, y_max % m, a, m
+
+def count_semigroup(p,q,r,x):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        x (int): the bound to count up to, at most N_0 + 1
+
+    Returns (int): the number of integers in [0, x) in the semigroup minimally generated by p*q, q*r, and r*p,
+        counted as lattice points under a line for each row of progressions in O(min(p, q, r) log(p*q*r)) steps
+    '''
+    # the semigroup is symmetric in p, q, r, so make p the smallest to have the fewest rows
+    p, q, r = sorted((p,q,r))
+    pq, pr = p*q, p*r
+
+    total = 0
+    for i in range(p-1):
+        start = i*q*r
+        if start >= x:
+            break
+        # the progressions with bases start + j*p*r below x, for j < q - 1, each have ((x - 1 - base) // (p*q)) + 1 elements below x;
+        # counting j down from the last base makes the slope positive
+        count = min(q-1, -((start - x)//pr))
+        total += _floor_sum(count, pq, pr, x - 1 - start - (count-1)*pr) + count
+
+    return total
+
+def tau_at(p,q,r,n):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        n (int): the index to evaluate tau at, between 0 and N_0 + 1
+
+    Returns (int): compute_tau(p,q,r)[n], without computing the rest of the tau sequence
+    '''
+    N0 = find_naught(p,q,r)
+    if not 0 <= n <= max(N0 + 1, 0):
+        raise ValueError(f'tau is only defined between 0 and N0 + 1 = {N0 + 1}, got {n}')
+    if N0 < 0:
+        return 0
+
+    # tau(n) counts the elements of the semigroup below n, minus the elements s with N0 - s below n
+    below = count_semigroup(p,q,r,N0+1)
+    return count_semigroup(p,q,r,n) - (below - count_semigroup(p,q,r,N0+1-n))
+
+def _semigroup_membership(p,q,r):
+    # every residue mod p*q belongs to at most one progression, so n < N0 is in the semigroup exactly when the base of its residue is at most n
+    pq = p*q
+    return pq, {base % pq: base for base in progression_bases(p,q,r)}
+
+def delta_window(p,q,r,start,stop):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        start, stop (int): the range of indices to evaluate delta at, within 0 and N_0 + 1
+
+    Returns (list[int]): compute_delta(p,q,r)[start:stop], in time proportional to the window and the number of progressions
+    '''
     N0 = find_naught(p,q,r)
-    compress = compress_tau(p,q,r)
-    ret = []
-
-    if compress[1] > compress[0]:
-        ret.append(0)
-
-    # may be a bit more concise way to rewrite this code using multiplication of differences
-    for i in range(1, len(compress)-1):
-        if compress[i] > compress[i-1] and compress[i] > compress[i+1]:
-            ret.append(compress[i])
-        if compress[i] < compress[i-1] and compress[i] < compress[i+1]:
-            ret.append(compress[i])
-    if compress[-1] < compress[-2]:
-        ret.append(compress[-1])
-    return ret
+    start, stop = max(start, 0), min(stop, N0 + 1)
+    pq, bases = _semigroup_membership(p,q,r)
+
+    window = []
+    for n in range(start, stop):
+        base = bases.get(n % pq)
+        if base is not None and base <= n < N0:
+            window.append(1)
+        else:
+            base = bases.get((N0 - n) % pq)
+            window.append(-1 if base is not None and base <= N0 - n < N0 else 0)
+    return window
+
+def tau_window(p,q,r,start,stop):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        start, stop (int): the range of indices to evaluate tau at, within 0 and N_0 + 2
+
+    Returns (list[int]): compute_tau(p,q,r)[start:stop], from tau_at(p,q,r,start) and the partial sums of delta over the window
+    '''
+    N0 = find_naught(p,q,r)
+    start, stop = max(start, 0), min(stop, max(N0 + 2, 1))
+    if start >= stop:
+        return []
+
+    window = [tau_at(p,q,r,start)]
+    for step in delta_window(p,q,r,start,stop-1):
+        window.append(window[-1] + step)
+    return window
+
+def _load_numpy():
+    '''
+    Returns (module): numpy, imported on first use so that importing this module, e.g. in every worker of a sweep, does not pay for it
+    '''
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+def _use_numpy(backend, as_array):
+    '''
+    Args:
+        backend (str): the requested backend, either 'python' or 'numpy'
+        as_array (bool): whether a numpy array was requested as output
+
+    Returns (bool): whether the numpy backend should be used
+    '''
+    if backend not in ('python', 'numpy'):
+        raise ValueError(f"unknown backend {backend!r}, expected 'python' or 'numpy'")
+    if backend == 'numpy' or as_array:
+        try:
+            _load_numpy()
+        except ImportError:
+            raise ImportError("the numpy backend requires numpy to be installed")
+        return True
+    return False
+
+def _tau_dtype(N0):
+    '''
+    Args:
+        N0 (int): the last index in the tau sequence
+
+    Returns (numpy.dtype): the smallest signed integer dtype that can hold every partial sum of a delta sequence of length N0+1
+    '''
+    return _load_numpy().min_scalar_type(-(N0+1))
+
+def _numpy_delta(p,q,r,stop=None,reflect=False):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        stop (int): an optional argument to only build the indices below stop, e.g. find_middle(p,q,r)
+        reflect (bool): an optional argument to still return the whole sequence, filling the indices after N0 - stop
+            in place by delta(N0 - n) = -delta(n); stop must then be at most find_middle(p,q,r)
+
+    Returns (numpy.ndarray): the delta sequence as an int8 array, built by scatter assignment along each arithmetic progression
+    '''
+    _load_numpy()
+    N0 = find_naught(p,q,r)
+    pq = p*q
+    if stop is None:
+        stop = max(N0+1, 0)
+    delta = np.zeros(max(N0+1, 0) if reflect else stop, dtype=np.int8)
+
+    for base in progression_bases(p,q,r):
+        # the elements base + k*p*q below N0, and their reflections N0 minus those elements
+        delta[base:min(N0, stop):pq] = 1
+        top = N0 - base
+        if top >= stop:
+            # the last reflection below stop
+            top = stop - 1 - (stop - 1 - top) % pq
+        if top > 0:
+            delta[top:0:-pq] = -1
+
+    if reflect and stop > 0:
+        np.negative(delta[stop-1::-1], out=delta[N0+1-stop:])
+    return delta
+
+def _numpy_tau(delta):
+    '''
+    Args:
+        delta (numpy.ndarray): the delta sequence, output of _numpy_delta
+
+    Returns (numpy.ndarray): the tau sequence, the partial sums of the delta sequence starting from 0
+    '''
+    _load_numpy()
+    tau = np.zeros(len(delta)+1, dtype=_tau_dtype(len(delta)-1))
+    np.cumsum(delta, dtype=tau.dtype, out=tau[1:])
+    return tau
+
+def _numpy_compress(delta, N0=None, reflect=False):
+    '''
+    Args:
+        delta (numpy.ndarray): the delta sequence, output of _numpy_delta
+        N0 (int): an optional argument to give the last index of the whole delta sequence when delta is only its beginning,
+            so that the dtype is the same as for the whole sequence
+        reflect (bool): an optional argument, when delta is the part before find_middle, to fill in the rest of the
+            compressed tau sequence in place as the reflection of its beginning
+
+    Returns (numpy.ndarray): the compressed tau sequence; every nonzero value of delta changes tau by exactly one,
+        so these are just the partial sums of the nonzero values of delta
+    '''
+    _load_numpy()
+    steps = delta[delta != 0]
+    count = len(steps)
+    compress = np.zeros(2*count+1 if reflect else count+1, dtype=_tau_dtype(len(delta)-1 if N0 is None else N0))
+    np.cumsum(steps, dtype=compress.dtype, out=compress[1:count+1])
+    if reflect and count:
+        compress[count+1:] = compress[count-1::-1]
+    return compress
+
+def _numpy_turns(steps, value=0, direction=-1, final=False, dtype=None):
+    '''
+    Args:
+        steps (numpy.ndarray): consecutive nonzero values of the delta sequence, the steps of the compressed tau sequence
+        value, direction, final: optional arguments as in _turns
+        dtype (numpy.dtype): an optional argument to specify the dtype of the extrema, wide enough for every value of tau; defaults to int64
+
+    Returns (tuple of 3): the same as _turns, vectorized, with the extrema as an array
+    '''
+    _load_numpy()
+    dtype = np.int64 if dtype is None else dtype
+    previous = np.empty_like(steps)
+    previous[:1] = direction
+    previous[1:] = steps[:-1]
+    # the value before each step that changes direction is a local extremum
+    turns = np.flatnonzero(steps != previous)
+    sums = np.cumsum(steps, dtype=dtype)
+    sums += value
+    extrema = sums[turns]
+    np.subtract(extrema, steps[turns], out=extrema, casting='unsafe')
+
+    if len(steps):
+        value = int(sums[-1])
+        direction = int(steps[-1])
+    if final and direction == -1:
+        extrema = np.append(extrema, np.array([value], dtype=dtype))
+    return extrema, value, direction
+
+def _numpy_extrema(delta):
+    '''
+    Args:
+        delta (numpy.ndarray): the delta sequence, output of _numpy_delta
+
+    Returns (numpy.ndarray): the extrema sequence, read off from the changes of direction of the steps of the compressed tau sequence
+    '''
+    _load_numpy()
+    extrema, _, _ = _numpy_turns(delta[delta != 0], final=True, dtype=_tau_dtype(len(delta)-1))
+    return extrema
+
+def _numpy_half_extrema(delta, N0):
+    '''
+    Args:
+        delta (numpy.ndarray): the delta sequence before its middle, output of _numpy_delta(p,q,r,find_middle(p,q,r))
+        N0 (int): the last index of the whole delta sequence
+
+    Returns (tuple of 2): the same as _half_extrema, with the extrema as an array
+    '''
+    _load_numpy()
+    first, value, _ = _numpy_turns(delta[delta != 0], dtype=_tau_dtype(N0))
+    return first, value
 
 def main():
     p = int(input("p: "))
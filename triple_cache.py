@@ -0,0 +1,167 @@
+import os
+import sys
+import pickle
+import sqlite3
+from collections import OrderedDict
+
+import family
+import instrument
+import tau_extrema_sequence
+
+def _sizeof(value):
+    '''
+    Args:
+        value (object): a cached value, made of ints, lists, tuples and dicts
+
+    Returns (int): an estimate of the number of bytes used by value
+    '''
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_sizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_sizeof(key) + _sizeof(item) for key, item in value.items())
+    return size
+
+class TripleCache:
+    '''
+    Class which represents a two-tier cache of per-triple results: an in-process LRU tier bounded by memory,
+    and an optional SQLite tier on disk that is shared between runs and worker processes
+
+    Attributes:
+        max_bytes (int): the memory bound of the in-process tier
+        path (str): the path of the on-disk tier, or None to keep everything in memory
+        memory (OrderedDict): the in-process tier, from (kind, p, q, r) to (value, size), in order of last use
+        memory_bytes (int): the estimated number of bytes held by the in-process tier
+        hits (dict[str, int]): the number of memory hits, disk hits and misses
+    '''
+    def __init__(self, max_bytes=256*2**20, path=None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = {'memory': 0, 'disk': 0, 'miss': 0}
+        self._connection = None
+        self._connection_pid = None
+
+    def _disk(self):
+        # sqlite connections cannot be shared across a fork, so each worker process opens its own
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection_pid = os.getpid()
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS cache ("
+                    "kind TEXT NOT NULL, p INTEGER NOT NULL, q INTEGER NOT NULL, r INTEGER NOT NULL, value BLOB NOT NULL, "
+                    "PRIMARY KEY (kind, p, q, r)) WITHOUT ROWID"
+                )
+        return self._connection
+
+    def _remember(self, key, value):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        self.memory[key] = (value, size)
+        self.memory_bytes += size
+
+        # evict the least recently used entries until we are back under the memory bound
+        while self.memory_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.memory.popitem(last=False)
+            self.memory_bytes -= evicted_size
+
+    def get_or_compute(self, kind, triple, compute):
+        '''
+        Args:
+            kind (str): the name of the quantity being cached, e.g. 'extrema'
+            triple (tuple[int, int, int]): parameters of the Brieskorn sphere
+            compute (callable): function of p, q, r computing the quantity on a miss
+
+        Returns (object): the cached or freshly computed value; it is shared with the cache, so it should not be modified
+        '''
+        key = (kind,) + tuple(triple)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits['memory'] += 1
+            return self.memory[key][0]
+
+        if self.path is not None:
+            row = self._disk().execute("SELECT value FROM cache WHERE kind = ? AND p = ? AND q = ? AND r = ?", key).fetchone()
+            if row is not None:
+                value = pickle.loads(row[0])
+                self.hits['disk'] += 1
+                self._remember(key, value)
+                return value
+
+        self.hits['miss'] += 1
+        value = compute(*triple)
+        self._remember(key, value)
+
+        if self.path is not None:
+            with self._disk() as connection:
+                connection.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)", key + (pickle.dumps(value, pickle.HIGHEST_PROTOCOL),))
+        return value
+
+    def stats(self):
+        '''
+        Returns (dict[str, int]): the hit and miss counts, and the number of entries and bytes in the in-process tier
+        '''
+        stats = dict(self.hits)
+        stats['entries'] = len(self.memory)
+        stats['bytes'] = self.memory_bytes
+        return stats
+
+    def clear(self):
+        '''
+        Returns (None): empties the in-process tier and resets the statistics; the on-disk tier is kept
+        '''
+        self.memory.clear()
+        self.memory_bytes = 0
+        self.hits = {'memory': 0, 'disk': 0, 'miss': 0}
+
+_cache = TripleCache()
+
+def configure(max_bytes=256*2**20, path=None):
+    '''
+    Args:
+        max_bytes (int): an optional argument to specify the memory bound of the in-process tier
+        path (str): an optional argument to specify a SQLite file for the on-disk tier
+
+    Returns (TripleCache): the new default cache; worker processes forked afterwards inherit it
+    '''
+    global _cache
+    _cache = TripleCache(max_bytes, path)
+    return _cache
+
+def stats():
+    return _cache.stats()
+
+def _extrema_sequence(p,q,r):
+    # only the first half of the delta sequence is walked, and the extrema after its middle are reflected
+    return tau_extrema_sequence.extrema_sequence(p,q,r,half=True)
+
+def extrema_sequence(p,q,r):
+    '''
+    Returns (list[int]): tau_extrema_sequence.extrema_sequence(p,q,r), computed at most once per triple
+    '''
+    return _cache.get_or_compute('extrema', (p,q,r), _extrema_sequence)
+
+def _monotone_subroot(p,q,r):
+    # imported here since graded_roots itself uses this cache
+    import graded_roots
+    return graded_roots.maximal_monotone_subroot(extrema_sequence(p,q,r))
+
+def maximal_monotone_subroot(p,q,r):
+    '''
+    Returns (dict[int, int]): the maximal monotone subroot of (p, q, r), computed at most once per triple
+    '''
+    return _cache.get_or_compute('subroot', (p,q,r), _monotone_subroot)
+
+def _tau_minimum(p,q,r):
+    p, q, r = family.canonical_triple(p,q,r)
+    with instrument.stage('tau_minimum', p=p, q=q, r=r):
+        return family.BrieskornFamily(p,q).tau_minimum(r)
+
+def tau_minimum(p,q,r):
+    '''
+    Returns (int): the minimum of the tau sequence of (p, q, r), computed at most once per triple
+    '''
+    return _cache.get_or_compute('tau_min', (p,q,r), _tau_minimum)
@@ -0,0 +1,469 @@
+import io
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import functools
+import itertools
+import importlib.util
+from fractions import Fraction
+
+import family
+import sweep
+import find_d_invariant
+import tau_extrema_sequence
+
+# the reference engine: the straightforward definitions the fast paths were derived from, kept slow on purpose
+
+def reference_semigroup(p,q,r):
+    '''
+    Returns (list[int]): the elements of the semigroup generated by p*q, q*r and r*p below N_0, from every combination i*q*r + j*p*r + k*p*q
+    '''
+    N0 = tau_extrema_sequence.find_naught(p,q,r)
+    semigroup = []
+    for i in range(p-1):
+        for j in range(q-1):
+            for k in range(r-1):
+                if i*q*r + j*p*r + k*p*q < N0:
+                    semigroup.append(i*q*r + j*p*r + k*p*q)
+    semigroup.sort()
+    return semigroup
+
+def reference_delta(p,q,r):
+    '''
+    Returns (list[int]): the delta sequence, 1 at the semigroup elements and -1 at their reflections N_0 minus an element
+    '''
+    N0 = tau_extrema_sequence.find_naught(p,q,r)
+    delta = [0]*(N0+1)
+    for num in reference_semigroup(p,q,r):
+        delta[num] = 1
+        delta[N0 - num] = -1
+    return delta
+
+def reference_tau(p,q,r):
+    '''
+    Returns (list[int]): the tau sequence, the partial sums of the delta sequence starting from 0
+    '''
+    tau = [0]
+    for step in reference_delta(p,q,r):
+        tau.append(tau[-1] + step)
+    return tau
+
+def reference_compressed_tau(p,q,r):
+    '''
+    Returns (list[int]): the tau sequence with consecutive duplicates removed
+    '''
+    compress = [0]
+    for value in reference_tau(p,q,r):
+        if compress[-1] != value:
+            compress.append(value)
+    return compress
+
+def reference_extrema(p,q,r):
+    '''
+    Returns (list[int]): the local extrema of the compressed tau sequence, comparing every entry with both of its neighbours
+    '''
+    compress = reference_compressed_tau(p,q,r)
+    if len(compress) == 1:
+        return compress
+
+    extrema = [0] if compress[1] > compress[0] else []
+    for i in range(1, len(compress)-1):
+        if (compress[i] - compress[i-1])*(compress[i+1] - compress[i]) < 0:
+            extrema.append(compress[i])
+    if compress[-1] < compress[-2]:
+        extrema.append(compress[-1])
+    return extrema
+
+def reference_tau_minimum(p,q,r):
+    '''
+    Returns (int): the minimum of the whole tau sequence
+    '''
+    return min(reference_tau(p,q,r))
+
+def reference_subroot(p,q,r):
+    '''
+    Returns (dict[int, int]): the maximal monotone subroot, by a BFS from every stem node of the whole graph
+    '''
+    import graded_roots
+    return graded_roots.naive_maximal_monotone_subroot(reference_extrema(p,q,r))
+
+def reference_dedekind(a,b):
+    '''
+    Returns (Fraction): the Dedekind sum s(a,b), from its definition as a sum over i = 1, ..., b-1
+    '''
+    def sawtooth(x):
+        return Fraction(0) if x.denominator == 1 else x - math.floor(x) - Fraction(1, 2)
+    return sum((sawtooth(Fraction(i, b))*sawtooth(Fraction(a*i, b)) for i in range(1, b)), Fraction(0))
+
+def reference_d_invariant(p,q,r):
+    '''
+    Returns (int): the d-invariant, with the Dedekind sums from their definition and the minimum of the whole tau sequence
+    '''
+    consts = find_d_invariant.find_constants(p,q,r)
+    dedekind_sum = reference_dedekind(consts[1],p) + reference_dedekind(consts[2],q) + reference_dedekind(consts[3],r)
+    return find_d_invariant.d_from_invariants(p,q,r, dedekind_sum, reference_tau_minimum(p,q,r))
+
+# the fast engines; each returns the same value as the reference of its check, as plain lists and dicts
+
+def _family_semigroup(p,q,r):
+    return list(family.BrieskornFamily(p,q).semigroup(r))
+
+def _window_delta(p,q,r):
+    return tau_extrema_sequence.delta_window(p,q,r,0,tau_extrema_sequence.find_naught(p,q,r)+1)
+
+def _window_tau(p,q,r, width=97):
+    # many short windows, so that tau_at is evaluated at many starting points
+    length = max(tau_extrema_sequence.find_naught(p,q,r) + 2, 1)
+    return [value for start in range(0, length, width) for value in tau_extrema_sequence.tau_window(p,q,r,start,start+width)]
+
+def _family_extrema(p,q,r, half=True):
+    return family.BrieskornFamily(p,q).extrema_sequence(r, half)
+
+def _family_tau_minimum(p,q,r, half=True):
+    return family.BrieskornFamily(p,q).tau_minimum(r, half)
+
+def _out_of_core_delta(p,q,r):
+    import numpy as np
+    import out_of_core
+    chunks = list(out_of_core.iter_delta_chunks(p,q,r,chunk=4096))
+    return np.concatenate(chunks).tolist() if chunks else []
+
+def _out_of_core_extrema(p,q,r):
+    import out_of_core
+    return out_of_core.extrema_sequence(p,q,r,chunk=4096).tolist()
+
+def _out_of_core_tau_minimum(p,q,r):
+    import out_of_core
+    return out_of_core.tau_minimum(p,q,r,chunk=4096)
+
+def _out_of_core_d_invariant(p,q,r):
+    import out_of_core
+    return out_of_core.d_invariant(p,q,r,chunk=4096)
+
+def _stem_subroot(p,q,r):
+    import graded_roots
+    return graded_roots.maximal_monotone_subroot(tau_extrema_sequence.extrema_sequence(p,q,r))
+
+def _compact_subroot(p,q,r):
+    import graded_roots
+    return graded_roots.build_compact_graph(tau_extrema_sequence.extrema_sequence(p,q,r,half=True)).maximal_monotone_subroot()
+
+def _family_subroot(p,q,r):
+    import graded_roots
+    return graded_roots.maximal_monotone_subroot(family.BrieskornFamily(p,q).extrema_sequence(r))
+
+def _find_d_invariant(p,q,r):
+    import triple_cache
+    # time the computation itself rather than a hit in the per-triple cache, and leave the caller's cache as it was
+    previous = triple_cache._cache
+    triple_cache._cache = triple_cache.TripleCache(max_bytes=0)
+    try:
+        return find_d_invariant.find_d_invariant(p,q,r)
+    finally:
+        triple_cache._cache = previous
+
+_delta, _tau, _compress, _extrema = (tau_extrema_sequence.compute_delta, tau_extrema_sequence.compute_tau,
+    tau_extrema_sequence.compress_tau, tau_extrema_sequence.extrema_sequence)
+
+# each check is (reference, engines), where engines maps the name of each fast engine to a function of p, q, r;
+# the workers look the functions up by name, so only the names are sent to them
+CHECKS = {
+    'semigroup': (reference_semigroup, {
+        'iter': tau_extrema_sequence.needed_semigroup,
+        'family': _family_semigroup,
+    }),
+    'delta': (reference_delta, {
+        'python': _delta,
+        'half': functools.partial(_delta, half=True),
+        'window': _window_delta,
+        'numpy': functools.partial(_delta, backend='numpy'),
+        'numpy-half': functools.partial(_delta, backend='numpy', half=True),
+        'out-of-core': _out_of_core_delta,
+    }),
+    'tau': (reference_tau, {
+        'python': _tau,
+        'half': functools.partial(_tau, half=True),
+        'window': _window_tau,
+        'numpy': functools.partial(_tau, backend='numpy'),
+        'numpy-half': functools.partial(_tau, backend='numpy', half=True),
+    }),
+    'compressed': (reference_compressed_tau, {
+        'python': _compress,
+        'half': functools.partial(_compress, half=True),
+        'numpy': functools.partial(_compress, backend='numpy'),
+        'numpy-half': functools.partial(_compress, backend='numpy', half=True),
+    }),
+    'extrema': (reference_extrema, {
+        'python': _extrema,
+        'half': functools.partial(_extrema, half=True),
+        'family': _family_extrema,
+        'family-full': functools.partial(_family_extrema, half=False),
+        'numpy': functools.partial(_extrema, backend='numpy'),
+        'numpy-half': functools.partial(_extrema, backend='numpy', half=True),
+        'out-of-core': _out_of_core_extrema,
+    }),
+    'tau-minimum': (reference_tau_minimum, {
+        'family': _family_tau_minimum,
+        'family-full': functools.partial(_family_tau_minimum, half=False),
+        'out-of-core': _out_of_core_tau_minimum,
+    }),
+    'subroot': (reference_subroot, {
+        'stem': _stem_subroot,
+        'compact': _compact_subroot,
+        'family': _family_subroot,
+    }),
+    'd-invariant': (reference_d_invariant, {
+        'find_d_invariant': _find_d_invariant,
+        'out-of-core': _out_of_core_d_invariant,
+    }),
+}
+
+# engines that need numpy, skipped when it is not installed
+NUMPY_ENGINES = {'numpy', 'numpy-half', 'out-of-core'}
+
+def select(checks=None, engines=None):
+    '''
+    Args:
+        checks (list[str]): an optional argument to only run some of the checks, keys of CHECKS
+        engines (list[str]): an optional argument to only run some of the engines of each check
+
+    Returns (tuple[tuple[str, str]]): the pairs (check, engine) to run, grouped by check
+    '''
+    pairs = []
+    for check, (_, table) in CHECKS.items():
+        if checks is not None and check not in checks:
+            continue
+        for engine in table:
+            if engines is not None and engine not in engines:
+                continue
+            if engine in NUMPY_ENGINES and importlib.util.find_spec('numpy') is None:
+                continue
+            pairs.append((check, engine))
+    return tuple(pairs)
+
+def run_checks(p,q,r,pairs):
+    '''
+    Args:
+        p, q, r (int): parameters of the Brieskorn sphere
+        pairs (tuple[tuple[str, str]]): output of select
+
+    Returns (list[tuple]): (check, engine, matches, reference seconds, engine seconds, error) for each pair, where the reference of each check
+        is computed and timed once, and error describes the exception the engine raised, if any
+    '''
+    results = []
+    for check, group in itertools.groupby(pairs, key=lambda pair: pair[0]):
+        reference, table = CHECKS[check]
+        start = time.perf_counter()
+        expected = reference(p,q,r)
+        reference_seconds = time.perf_counter() - start
+
+        for _, engine in group:
+            start = time.perf_counter()
+            try:
+                actual = table[engine](p,q,r)
+                error = None
+            except Exception as e:
+                actual = None
+                error = f'{type(e).__name__}: {e}'
+            seconds = time.perf_counter() - start
+            results.append((check, engine, error is None and actual == expected, reference_seconds, seconds, error))
+    return results
+
+def random_triples(count, max_p=7, max_q=13, max_r=400, seed=None):
+    '''
+    Args:
+        count (int): the number of triples to yield
+        max_p, max_q, max_r (int): optional arguments to bound p < q < r
+        seed (int): an optional argument to seed the choice of triples
+
+    Returns (generator[tuple[int, int, int]]): lazily yields count random valid triples p < q < r
+    '''
+    rng = random.Random(seed)
+    yielded = 0
+    while yielded < count:
+        p = rng.randint(2, max_p)
+        q = rng.randint(p+1, max(p+1, max_q))
+        r = rng.randint(q+1, max(q+1, max_r))
+        if sweep.is_valid_triple(p,q,r):
+            yielded += 1
+            yield (p,q,r)
+
+def boundary_triples(max_p=5, max_q=11):
+    '''
+    Args:
+        max_p, max_q (int): optional arguments to bound p < q
+
+    Returns (list[tuple[int, int, int]]): the valid triples where the fast paths have edge cases:
+        r just above q, where the semigroup has few rows of length p*q, r next to the first multiples of p*q,
+        where the residue layouts of the families wrap around, and the degenerate triples (p, q, 1), where N_0 is negative
+        and every backend must still give tau = [0] and the extrema [0]
+    '''
+    triples = set()
+    for p in range(2, max_p+1):
+        for q in range(p+1, max_q+1):
+            pq = p*q
+            if sweep.is_valid_triple(p,q,1):
+                triples.add((p,q,1))
+            candidates = [q+1, q+2, q+3] + [k*pq + d for k in (1, 2) for d in (-2, -1, 1, 2)]
+            for r in candidates:
+                if r > q and sweep.is_valid_triple(p,q,r):
+                    triples.add((p,q,r))
+    return sorted(triples)
+
+def _candidates(value):
+    # the smallest values first, then values closer and closer to the current one
+    closer = [value - (value >> k) for k in range(1, value.bit_length())]
+    return sorted(set(range(2, min(value, 12))) | set(v for v in closer if 2 <= v < value))
+
+def shrink(check, engine, triple, max_tries=2000):
+    '''
+    Args:
+        check, engine (str): the pair that fails on triple
+        triple (tuple[int, int, int]): a triple on which the engine disagrees with the reference
+        max_tries (int): an optional argument to bound the number of candidate triples computed
+
+    Returns (tuple[int, int, int]): a failing valid triple obtained by repeatedly lowering one parameter at a time,
+        such that lowering any single parameter further either makes it invalid or makes the engine agree
+    '''
+    current = tuple(triple)
+    tries = 0
+    improved = True
+    while improved and tries < max_tries:
+        improved = False
+        for i in range(3):
+            for value in _candidates(current[i]):
+                candidate = current[:i] + (value,) + current[i+1:]
+                if not sweep.is_valid_triple(*candidate):
+                    continue
+                tries += 1
+                if not run_checks(*candidate, pairs=((check, engine),))[0][2]:
+                    current = candidate
+                    improved = True
+                    break
+            if improved:
+                break
+    return current
+
+def validate(triples, checks=None, engines=None, processes=None, chunksize=4, shrink_failures=True, max_failures=10):
+    '''
+    Args:
+        triples (iterable[tuple[int, int, int]]): the valid triples to check
+        checks, engines (list[str]): optional arguments to restrict the pairs run, see select
+        processes (int): an optional argument to specify the number of worker processes, as in sweep.sweep
+        chunksize (int): an optional argument to specify how many triples are sent to a worker at a time
+        shrink_failures (bool): an optional argument to shrink the first failure of every pair to a minimal failing triple
+        max_failures (int): an optional argument to bound the number of failing triples listed per pair
+
+    Returns (dict): a machine-readable report with the number of triples, the wall time, one summary per pair with its mismatches
+        and the throughput of the reference and of the engine in triples per second of computation, and the failures
+    '''
+    pairs = select(checks, engines)
+    totals = {pair: {'check': pair[0], 'engine': pair[1], 'triples': 0, 'mismatches': 0, 'reference_seconds': 0.0, 'engine_seconds': 0.0} for pair in pairs}
+    failures = []
+
+    start = time.perf_counter()
+    count = 0
+    for triple, results in sweep.sweep(functools.partial(run_checks, pairs=pairs), triples, processes=processes, chunksize=chunksize, ordered=False):
+        count += 1
+        for check, engine, matches, reference_seconds, seconds, error in results:
+            total = totals[check, engine]
+            total['triples'] += 1
+            total['reference_seconds'] += reference_seconds
+            total['engine_seconds'] += seconds
+            if not matches:
+                total['mismatches'] += 1
+                if total['mismatches'] <= max_failures:
+                    failures.append({'check': check, 'engine': engine, 'triple': list(triple), 'error': error})
+    wall_seconds = time.perf_counter() - start
+
+    if shrink_failures:
+        shrunk = set()
+        for failure in failures:
+            pair = (failure['check'], failure['engine'])
+            if pair not in shrunk:
+                shrunk.add(pair)
+                failure['minimal'] = list(shrink(*pair, failure['triple']))
+
+    for total in totals.values():
+        total['reference_throughput'] = total['triples']/total['reference_seconds'] if total['reference_seconds'] else None
+        total['engine_throughput'] = total['triples']/total['engine_seconds'] if total['engine_seconds'] else None
+
+    return {
+        'triples': count,
+        'processes': processes,
+        'wall_seconds': wall_seconds,
+        'pairs': list(totals.values()),
+        'failures': failures,
+    }
+
+def check_conjecture_log(a=3, b_range=range(4, 9), processes=2):
+    '''
+    Args:
+        a (int): an optional argument to specify the fixed first parameter of the sweep
+        b_range (iterable[int]): an optional argument to specify the values of b to sweep over
+        processes (int): an optional argument to specify the number of worker processes, more than one so that the pool can reorder results
+
+    Returns (bool): whether graded_roots.write_conjecture_log writes one line per triple in increasing b and then c,
+        with a counterexample, if any, only on the last line
+    '''
+    import graded_roots
+    log = io.StringIO()
+    graded_roots.write_conjecture_log(a, b_range, log, processes=processes)
+    lines = log.getvalue().splitlines()
+    if lines and lines[-1].startswith('OHHHH NOOOO'):
+        lines.pop()
+
+    keys = [tuple(int(part) for part in line.split(', ')[1:3]) for line in lines]
+    return all(key < following for key, following in zip(keys, keys[1:])) and not any(line.endswith('False') for line in lines[:-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the fast engines side by side with the reference implementations on random and boundary triples.')
+    parser.add_argument('--random', type=int, default=200, help='number of random triples')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--max-p', type=int, default=7)
+    parser.add_argument('--max-q', type=int, default=13)
+    parser.add_argument('--max-r', type=int, default=400)
+    parser.add_argument('--no-boundary', action='store_true', help='skip the boundary triples')
+    parser.add_argument('--file', help='file with more triples to check, one per line, or - for standard input')
+    parser.add_argument('--check', action='append', dest='checks', choices=sorted(CHECKS), help='only run this check; can be given more than once')
+    parser.add_argument('--engine', action='append', dest='engines', help='only run this engine; can be given more than once')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--chunksize', type=int, default=4)
+    parser.add_argument('--no-shrink', action='store_true', help='do not shrink failures to minimal triples')
+    parser.add_argument('--no-log-order', action='store_true', help='skip the check of the order of the shift conjecture log')
+    parser.add_argument('--output', help='where to write the JSON report')
+    args = parser.parse_args(argv)
+
+    sources = [random_triples(args.random, args.max_p, args.max_q, args.max_r, args.seed)]
+    if not args.no_boundary:
+        sources.append(boundary_triples(args.max_p, args.max_q))
+    if args.file is not None:
+        sources.append(triple for triple in sweep.read_triples(args.file) if len(triple) == 3 and sweep.is_valid_triple(*triple))
+
+    report = validate(itertools.chain(*sources), args.checks, args.engines, args.processes, args.chunksize, not args.no_shrink)
+
+    print(f"{report['triples']} triples in {report['wall_seconds']:.2f}s")
+    for total in report['pairs']:
+        speedup = total['reference_seconds']/total['engine_seconds'] if total['engine_seconds'] else float('inf')
+        print(f"{total['check']}/{total['engine']}: {total['mismatches']} mismatches, reference {total['reference_throughput'] or 0:.1f}/s, "
+              f"engine {total['engine_throughput'] or 0:.1f}/s ({speedup:.1f}x)")
+    for failure in report['failures']:
+        minimal = f", minimal {tuple(failure['minimal'])}" if 'minimal' in failure else ''
+        error = f" ({failure['error']})" if failure['error'] else ''
+        print(f"MISMATCH {failure['check']}/{failure['engine']} on {tuple(failure['triple'])}{minimal}{error}")
+
+    if not args.no_log_order:
+        report['log_ordered'] = check_conjecture_log(processes=args.processes or 2)
+        print(f"conjecture log: {'in order' if report['log_ordered'] else 'OUT OF ORDER'}")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    return 1 if report['failures'] or report.get('log_ordered') is False else 0
+
+if __name__ == '__main__':
+    sys.exit(main())